@@ -3,6 +3,7 @@ from __future__ import absolute_import
 import os
 
 from celery import Celery
+from celery.schedules import crontab
 from django.apps import apps
 from kombu.entity import Exchange, Queue
 
@@ -23,6 +24,21 @@ app.conf.task_queues = (
         queue_arguments={"x-max-priority": 10},
     ),
 )
+app.conf.beat_schedule = {
+    "delete-unused-template-bodies": {
+        "task": "delete_unused_template_bodies",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    "compact-template-revisions": {
+        "task": "compact_template_revisions",
+        "schedule": crontab(hour=4, minute=0),
+    },
+    # Restores the gallery feed after the cache lost it
+    "rebuild-gallery-feed": {
+        "task": "rebuild_gallery_feed",
+        "schedule": crontab(minute=30),
+    },
+}
 CELERY_DEFAULT_QUEUE = "normal"
 CELERY_DEFAULT_EXCHANGE = "normal"
 CELERY_DEFAULT_ROUTING_KEY = "default"
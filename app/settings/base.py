@@ -193,6 +193,7 @@ GRAPHENE = {
     "MIDDLEWARE": (
         "graphene_django.debug.DjangoDebugMiddleware",
         "graphql_jwt.middleware.JSONWebTokenMiddleware",
+        "apps.base.loaders.DataLoaderMiddleware",
     ),
 }
 
@@ -220,6 +221,92 @@ CELERY_RESULT_BACKEND = "redis://localhost:6379"
 CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
+# Priority of template export jobs on the default queue (0-10)
+TEMPLATE_EXPORT_PRIORITY = 5
+# Rendered exports stay in memory up to this size before spilling to disk
+TEMPLATE_EXPORT_SPOOL_SIZE = 10 * 1024 * 1024
+# Rendered exports keyed by their html, "disk" keeps them in LOCATION up to
+# MAX_SIZE bytes (least recently used evicted first, checked after every
+# EVICT_AFTER bytes a process writes); "cache" keeps them in CACHE_ALIAS,
+# which then needs a dedicated cache with its own eviction policy as
+# MAX_SIZE is not enforced there
+TEMPLATE_RENDER_CACHE = {
+    "BACKEND": "disk",
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": 60 * 60 * 24 * 7,
+    "LOCATION": os.path.join(MEDIA_ROOT, "render_cache/"),
+    "MAX_SIZE": 1024 * 1024 * 1024,
+    "MAX_ENTRY_SIZE": 20 * 1024 * 1024,
+    "EVICT_AFTER": 50 * 1024 * 1024,
+}
+# Templates rendered concurrently by a bulk export, the renders run in
+# wkhtmltopdf/chrome subprocesses so threads are enough to use every core
+TEMPLATE_BULK_EXPORT_WORKERS = os.cpu_count() or 1
+# Gallery thumbnails of templates, generated DEBOUNCE seconds after the
+# last edit; PRIMARY is the (format, width) stored in Template.screenshot
+TEMPLATE_THUMBNAILS = {
+    "SIZE": (1280, 960),
+    "WIDTHS": [320, 640, 1280],
+    "FORMATS": ["webp", "jpeg"],
+    "PRIMARY": ("jpeg", 640),
+    "DEBOUNCE": 15,
+}
+# Converters run in up to WORKERS sandbox processes per celery process,
+# recycled after MAX_TASKS renders along with the headless chrome each of
+# them keeps for screenshots; a render is killed after TIMEOUT seconds or
+# above MAX_MEMORY bytes of resident memory, then retried
+TEMPLATE_RENDER_SANDBOX = {
+    "ENABLED": True,
+    "WORKERS": os.cpu_count() or 1,
+    "MAX_TASKS": 100,
+    "TIMEOUT": 120,
+    "MAX_MEMORY": 2 * 1024 * 1024 * 1024,
+    "RETRIES": 1,
+}
+# Bodies no template points at are deleted BATCH_SIZE digests at a time
+# once they are older than GRACE_PERIOD seconds, attaching a body again
+# renews its date
+TEMPLATE_BODY_CLEANUP = {
+    "BATCH_SIZE": 1000,
+    "GRACE_PERIOD": 60 * 60 * 24,
+}
+# Templates deleted per transaction by batch deletes
+TEMPLATE_BATCH_DELETE_CHUNK_SIZE = 500
+# Templates inserted per statement by imports and the number of invalid
+# records an import job reports
+TEMPLATE_IMPORT_BATCH_SIZE = 1000
+TEMPLATE_IMPORT_MAX_ERRORS = 100
+# Characters of a template that are kept in the search index
+TEMPLATE_SEARCH_MAX_DOCUMENT_LENGTH = 100000
+# The public gallery served from the cache, rebuilt DEBOUNCE seconds after
+# the first change and stored in chunks of CHUNK_SIZE template ids
+TEMPLATE_GALLERY_FEED = {
+    "CHUNK_SIZE": 1000,
+    "DEBOUNCE": 5,
+}
+# Responses of anonymous queries selecting only these root fields are
+# cached for TIMEOUT seconds, dropped early when a tag of a field changes
+GRAPHQL_RESPONSE_CACHE = {
+    "TIMEOUT": 300,
+    "FIELDS": {
+        "getPublicTemplates": ["template"],
+        "getGalleryFacets": ["template"],
+        "searchTemplates": ["template"],
+        "getBlogDetail": ["blog"],
+        "getFilterBlogs": ["blog"],
+    },
+}
+# Template body history, a full snapshot is stored every SNAPSHOT_EVERY
+# revisions; revisions older than KEEP_DAYS are thinned to one revision
+# per COMPACT_INTERVAL seconds
+TEMPLATE_REVISIONS = {
+    "SNAPSHOT_EVERY": 20,
+    "KEEP_DAYS": 7,
+    "COMPACT_INTERVAL": 60 * 60,
+}
+# Seconds a user's company access index stays cached, invites, removals
+# and administrator changes invalidate it right away
+COMPANY_ACCESS_CACHE_TIMEOUT = 60 * 60 * 24
 CACHE_MIDDLEWARE_ALIAS = "default"  # which cache alias to use
 CACHE_MIDDLEWARE_KEY_PREFIX = ""
 
@@ -18,13 +18,14 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_file_upload.django import FileUploadGraphQLView
+
+from app.views import CachedGraphQLView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path(
         "graphql",
-        csrf_exempt(FileUploadGraphQLView.as_view(graphiql=True)),
+        csrf_exempt(CachedGraphQLView.as_view(graphiql=True)),
     ),
 ]
 if settings.DEBUG:
@@ -0,0 +1,129 @@
+"""
+Response cache of the GraphQL endpoint
+
+Anonymous queries that only select the fields listed in
+GRAPHQL_RESPONSE_CACHE["FIELDS"] answer the same for every visitor, so
+their responses are cached by the normalized query document, operation and
+variables. Every field names the tags of the rows it reads; the current
+version of those tags is part of the cache key, so invalidating a tag moves
+all of its responses to new keys at once.
+"""
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from graphene_file_upload.django import FileUploadGraphQLView
+from graphql import (FieldNode, GraphQLError, OperationDefinitionNode,
+                     OperationType, parse, print_ast)
+from graphql_jwt.utils import get_http_authorization
+
+
+def _tag_key(tag):
+    return f"graphql:tag:{tag}"
+
+
+def invalidate_cached_responses(*tags):
+    """
+    Drop the cached responses of the tags once the transaction commits, so
+    no response of the old rows is cached under the new versions
+    """
+    transaction.on_commit(
+        lambda: cache.set_many(
+            {_tag_key(tag): uuid.uuid4().hex for tag in tags}, None
+        )
+    )
+
+
+def _tag_versions(tags):
+    keys = [_tag_key(tag) for tag in sorted(tags)]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    for key, version in missing.items():
+        # Another request may have set the version in the meantime
+        if not cache.add(key, version, None):
+            version = cache.get(key)
+        versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def _cached_tags(query, operation_name):
+    """
+    The (parsed document, tags) of a cacheable query operation, (None, None)
+    when any root field of the operation is not cacheable
+    """
+    fields = settings.GRAPHQL_RESPONSE_CACHE["FIELDS"]
+    try:
+        document = parse(query)
+    except GraphQLError:
+        return None, None
+    operations = [
+        definition
+        for definition in document.definitions
+        if isinstance(definition, OperationDefinitionNode)
+        and (
+            operation_name is None
+            or (definition.name and definition.name.value == operation_name)
+        )
+    ]
+    if len(operations) != 1:
+        return None, None
+    operation = operations[0]
+    if operation.operation != OperationType.QUERY:
+        return None, None
+    tags = set()
+    for selection in operation.selection_set.selections:
+        # Fragments on the root type would hide their fields
+        if not isinstance(selection, FieldNode):
+            return None, None
+        if selection.name.value == "__typename":
+            continue
+        if selection.name.value not in fields:
+            return None, None
+        tags.update(fields[selection.name.value])
+    return document, tags
+
+
+class CachedGraphQLView(FileUploadGraphQLView):
+    def get_cache_key(self, request, data):
+        if request.user.is_authenticated or get_http_authorization(request):
+            return None
+        query, variables, operation_name, _ = self.get_graphql_params(
+            request, data
+        )
+        if not query:
+            return None
+        document, tags = _cached_tags(query, operation_name)
+        if document is None:
+            return None
+        payload = json.dumps(
+            [
+                print_ast(document),
+                operation_name,
+                variables or {},
+                _tag_versions(tags),
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return f"graphql:response:{digest}"
+
+    def get_response(self, request, data, show_graphiql=False):
+        key = None if show_graphiql else self.get_cache_key(request, data)
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached, 200
+        result, status_code = super().get_response(
+            request, data, show_graphiql
+        )
+        if (
+            key is not None
+            and status_code == 200
+            and "errors" not in json.loads(result)
+        ):
+            cache.set(key, result, settings.GRAPHQL_RESPONSE_CACHE["TIMEOUT"])
+        return result, status_code
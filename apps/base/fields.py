@@ -0,0 +1,93 @@
+import zlib
+
+from django import forms
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+COMPRESSION_LEVEL = 6
+
+
+class CompressedText:
+    """
+    Compressed column value as read from the database
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def text(self):
+        try:
+            return zlib.decompress(self.data).decode("utf-8")
+        except zlib.error:
+            # Rows written before the column was compressed
+            return self.data.decode("utf-8")
+
+    def __str__(self):
+        return self.text()
+
+
+class CompressedTextAttribute(DeferredAttribute):
+    """
+    Decompresses the value on first access and keeps the text afterwards
+    """
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = instance.__dict__[self.field.attname] = value.text()
+        return value
+
+    def __set__(self, instance, value):
+        # A data descriptor, so reads do not bypass __get__ once loaded
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    A text field stored zlib compressed, rows are read without decompressing
+    and only the fields that are accessed get decompressed
+    """
+
+    descriptor_class = CompressedTextAttribute
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def get_default(self):
+        default = super().get_default()
+        return "" if default == b"" else default
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, str):
+            return value
+        return CompressedText(bytes(value))
+
+    def to_python(self, value):
+        if isinstance(value, CompressedText):
+            return value.text()
+        if isinstance(value, (bytes, memoryview)):
+            return CompressedText(bytes(value)).text()
+        return value
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if isinstance(value, CompressedText):
+            return value.data
+        if isinstance(value, str):
+            return zlib.compress(value.encode("utf-8"), COMPRESSION_LEVEL)
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return super(models.BinaryField, self).formfield(
+            **{
+                "form_class": forms.CharField,
+                "widget": forms.Textarea,
+                **kwargs,
+            }
+        )
@@ -0,0 +1,125 @@
+from functools import lru_cache
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+from django.db.models import QuerySet, prefetch_related_objects
+from graphene.utils.str_converters import to_snake_case
+from graphene_django import DjangoObjectType
+from graphql import get_nullable_type
+
+from apps.base.selections import relation_fields, relation_name
+
+_snake_case = lru_cache(maxsize=None)(to_snake_case)
+
+
+def _related(instance, name, field):
+    if field.many_to_many or field.one_to_many:
+        return list(getattr(instance, name).all())
+    try:
+        related = getattr(instance, name)
+    except ObjectDoesNotExist:
+        return []
+    return [] if related is None else [related]
+
+
+class RelationLoader:
+    """
+    Per request registry of sibling model instances, a relation resolved on
+    one instance is prefetched for all of its siblings at once
+    """
+
+    def __init__(self):
+        self.batches = {}
+        self.loaded = set()
+
+    def add(self, instances):
+        batch = [
+            instance
+            for instance in instances
+            if isinstance(instance, models.Model)
+        ]
+        if len(batch) < 2:
+            return
+        for instance in batch:
+            self.batches.setdefault(id(instance), batch)
+
+    def register(self, result):
+        """
+        Remember the objects of a list or connection result as siblings
+        """
+        if isinstance(result, QuerySet):
+            result = list(result)
+        if isinstance(result, (list, tuple)):
+            self.add(result)
+        elif isinstance(getattr(result, "edges", None), list):
+            self.add([edge.node for edge in result.edges])
+        return result
+
+    def load(self, instance, name):
+        """
+        Prefetch the relation for the siblings of the instance, returns the
+        relation field or None when the name is not a relation
+        """
+        field = relation_fields(type(instance)).get(name)
+        if field is None:
+            return None
+        relation = relation_name(field)
+        batch = self.batches.get(id(instance))
+        if batch is not None and (id(batch), relation) not in self.loaded:
+            self.loaded.add((id(batch), relation))
+            prefetch_related_objects(batch, relation)
+            # The related objects are siblings of each other in turn
+            self.add(
+                related
+                for sibling in batch
+                for related in _related(sibling, relation, field)
+            )
+        return field
+
+
+def _uses_default_queryset(info):
+    graphene_type = getattr(
+        get_nullable_type(info.return_type), "graphene_type", None
+    )
+    return (
+        isinstance(graphene_type, type)
+        and issubclass(graphene_type, DjangoObjectType)
+        and graphene_type.get_queryset.__func__
+        is DjangoObjectType.get_queryset.__func__
+    )
+
+
+class DataLoaderMiddleware:
+    """
+    Batches ForeignKey and ManyToMany lookups of lists into single IN (...)
+    queries instead of one query per row
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        loader = self.get_loader(info.context)
+        if loader is None:
+            return next(root, info, **kwargs)
+        if isinstance(root, models.Model):
+            name = _snake_case(info.field_name)
+            field = loader.load(root, name)
+            # graphene-django refetches foreign keys through get_node, the
+            # prefetched object is the same row when get_queryset is stock
+            if (
+                field is not None
+                and relation_name(field) == name
+                and field.concrete
+                and (field.many_to_one or field.one_to_one)
+                and _uses_default_queryset(info)
+            ):
+                return getattr(root, name)
+        return loader.register(next(root, info, **kwargs))
+
+    @staticmethod
+    def get_loader(context):
+        if context is None:
+            return None
+        loader = getattr(context, "relation_loader", None)
+        if loader is None:
+            loader = RelationLoader()
+            setattr(context, "relation_loader", loader)
+        return loader
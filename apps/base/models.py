@@ -1,6 +1,6 @@
 import uuid
 
-from django.db import models
+from django.db import connections, models
 from django.utils import timezone
 
 now = timezone.now()
@@ -55,3 +55,22 @@ class Base(models.Model):
 
     class Meta:
         abstract = True
+
+
+def bulk_upsert(model, objs, unique_fields, update_fields):
+    """
+    Insert the rows and update update_fields of the rows that already exist
+    with one statement, mysql finds the conflicting key itself and rejects
+    unique_fields
+    """
+    features = connections[model.objects.db].features
+    return model.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=(
+            unique_fields
+            if features.supports_update_conflicts_with_target
+            else None
+        ),
+        update_fields=update_fields,
+    )
@@ -0,0 +1,131 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from graphene.relay import PageInfo
+from graphql import GraphQLError
+from graphql_relay import cursor_to_offset, offset_to_cursor
+
+
+def encode_cursor(instance):
+    value = f"{instance.date_created.isoformat()}|{instance.id}"
+    return base64.urlsafe_b64encode(value.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        date_created, id = value.decode("utf-8").split("|")
+        return datetime.fromisoformat(date_created), id
+    except (binascii.Error, UnicodeError, ValueError):
+        raise GraphQLError("Invalid cursor.")
+
+
+def _before(cursor):
+    date_created, id = decode_cursor(cursor)
+    return Q(date_created__lt=date_created) | Q(
+        date_created=date_created, id__lt=id
+    )
+
+
+def _after(cursor):
+    date_created, id = decode_cursor(cursor)
+    return Q(date_created__gt=date_created) | Q(
+        date_created=date_created, id__gt=id
+    )
+
+
+def page_size(size):
+    config = settings.GRAPHENE_DJANGO_EXTRAS
+    if size is None:
+        size = config["DEFAULT_PAGE_SIZE"]
+    if size < 0:
+        raise GraphQLError("The page size can't be negative.")
+    return min(size, config["MAX_PAGE_SIZE"])
+
+
+def paginate_keyset(
+    queryset, connection_type, first=None, last=None, after=None, before=None
+):
+    """
+    Build a relay connection over the queryset, newest first on
+    (date_created, id), a page only ever reads page size + 1 rows
+    """
+    if first is not None and last is not None:
+        raise GraphQLError("Pass either first or last, not both.")
+    size = page_size(first if last is None else last)
+    # The listing runs newest first, "after" a cursor means older rows
+    if after:
+        queryset = queryset.filter(_before(after))
+    if before:
+        queryset = queryset.filter(_after(before))
+    if last is None:
+        rows = list(queryset.order_by("-date_created", "-id")[: size + 1])
+        has_next_page, has_previous_page = len(rows) > size, bool(after)
+        rows = rows[:size]
+    else:
+        rows = list(queryset.order_by("date_created", "id")[: size + 1])
+        has_next_page, has_previous_page = bool(before), len(rows) > size
+        rows = rows[:size][::-1]
+    return keyset_connection(
+        rows, connection_type, has_next_page, has_previous_page
+    )
+
+
+def keyset_connection(rows, connection_type, has_next_page, has_previous_page):
+    """
+    The relay connection of a page of rows newest first, with the cursors
+    paginate_keyset reads
+    """
+    edges = [
+        connection_type.Edge(node=row, cursor=encode_cursor(row))
+        for row in rows
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_next_page=has_next_page,
+            has_previous_page=has_previous_page,
+        ),
+    )
+
+
+def paginate_offset(
+    queryset, connection_type, load=None, first=None, after=None, **kwargs
+):
+    """
+    Build a relay connection over an ordered queryset whose order can't be
+    a cursor (e.g. search ranks), pages forward by offset only; load maps
+    the rows of a page to the nodes
+    """
+    if kwargs.get("last") is not None or kwargs.get("before"):
+        raise GraphQLError("These results can only be paged forward.")
+    size = page_size(first)
+    offset = 0
+    if after:
+        offset = cursor_to_offset(after)
+        if offset is None or offset < 0:
+            raise GraphQLError("Invalid cursor.")
+        offset += 1
+    end = offset + size + 1
+    rows = list(queryset[offset:end])
+    has_next_page = len(rows) > size
+    rows = rows[:size]
+    nodes = load(rows) if load else rows
+    edges = [
+        connection_type.Edge(node=node, cursor=offset_to_cursor(offset + i))
+        for i, node in enumerate(nodes)
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_next_page=has_next_page,
+            has_previous_page=offset > 0,
+        ),
+    )
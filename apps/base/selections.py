@@ -0,0 +1,170 @@
+from functools import lru_cache
+
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def relation_name(field):
+    """
+    The attribute a relation is loaded through, reverse relations go by
+    their accessor name
+    """
+    if field.auto_created and not field.concrete:
+        return field.get_accessor_name()
+    return field.name
+
+
+@lru_cache(maxsize=None)
+def relation_fields(model):
+    """
+    Relation fields of the model by the attribute graphene resolves them
+    from, including the RELATION_ATTRIBUTES of the model that are read
+    through a relation (e.g. properties of a related row)
+    """
+    relations = {}
+    for field in model._meta.get_fields():
+        if not field.is_relation or field.related_model is None:
+            continue
+        relations[relation_name(field)] = field
+    for name, relation in getattr(model, "RELATION_ATTRIBUTES", {}).items():
+        relations[name] = relations[relation]
+    return relations
+
+
+def _fields(selection_set, fragments):
+    """
+    Yield the field nodes of a selection set with fragments flattened
+    """
+    for selection in selection_set.selections if selection_set else []:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _fields(selection.selection_set, fragments)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment:
+                yield from _fields(fragment.selection_set, fragments)
+
+
+def _children(nodes, info):
+    """
+    Field nodes selected below the nodes grouped by snake cased name,
+    aliases of the same field end up in one group
+    """
+    children = {}
+    for node in nodes:
+        for field in _fields(node.selection_set, info.fragments):
+            if field.name.value.startswith("__"):
+                continue
+            name = to_snake_case(field.name.value)
+            children.setdefault(name, []).append(field)
+    return children
+
+
+def _nodes_at(info, path):
+    nodes = list(info.field_nodes)
+    for name in path:
+        nodes = [
+            field
+            for node in nodes
+            for field in _fields(node.selection_set, info.fragments)
+            if field.name.value == name
+        ]
+    return nodes
+
+
+def selected_fields(info, path=()):
+    """
+    Snake cased names of the fields the query selects below the path, e.g.
+    ("edges", "node") for the nodes of a connection
+    """
+    return set(_children(_nodes_at(info, path), info))
+
+
+def join_if_selected(queryset, info, fields, relation, path=()):
+    """
+    Join the relation holding the given fields only when the query selects
+    any of them
+    """
+    if set(fields) & selected_fields(info, path):
+        return queryset.select_related(relation)
+    return queryset
+
+
+def _plan(model, nodes, info, prefix, select, prefetch):
+    """
+    Collect the select_related paths and Prefetch objects the selection
+    below the nodes needs
+    """
+    relations = relation_fields(model)
+    for name, children in _children(nodes, info).items():
+        field = relations.get(name)
+        if field is None:
+            continue
+        name = relation_name(field)
+        if field.one_to_one or (field.many_to_one and field.concrete):
+            select.append(f"{prefix}{name}")
+            _plan(
+                field.related_model,
+                children,
+                info,
+                f"{prefix}{name}__",
+                select,
+                prefetch,
+            )
+        else:
+            prefetch.append(
+                Prefetch(
+                    f"{prefix}{name}",
+                    queryset=_related_queryset(field, children, info),
+                )
+            )
+
+
+def _related_queryset(field, nodes, info):
+    """
+    Queryset of a prefetched relation, narrowed to the selected columns
+    when every selected field is a plain model field
+    """
+    model = field.related_model
+    select, prefetch = [], []
+    _plan(model, nodes, info, "", select, prefetch)
+    queryset = model._default_manager.all()
+    relations = relation_fields(model)
+    columns = {model._meta.pk.name}
+    columns.update(
+        path
+        for path in select
+        if "__" not in path and relations[path].concrete
+    )
+    if field.one_to_many:
+        # The foreign key back to the parent is what joins the prefetch
+        columns.add(field.field.name)
+    concrete = {
+        model_field.name
+        for model_field in model._meta.concrete_fields
+        if not model_field.is_relation
+    }
+    selected = set(_children(nodes, info)) - set(relations)
+    if selected <= concrete:
+        queryset = queryset.only(*columns, *selected)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def optimize_queryset(queryset, info, path=()):
+    """
+    Join forward relations and prefetch reverse and many to many relations
+    the query selects below the path, so they are not loaded row by row
+    """
+    select, prefetch = [], []
+    _plan(queryset.model, _nodes_at(info, path), info, "", select, prefetch)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from app.views import invalidate_cached_responses
+from apps.blog.models import Blog
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def invalidate_blog_responses(sender, **kwargs):
+    invalidate_cached_responses("blog")
@@ -1,5 +1,9 @@
 import pytest
 from django.contrib.auth.models import Permission
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
 from graphql_jwt.testcases import JSONWebTokenTestCase
 
 from apps.blog.tests.factories import BlogFactory
@@ -147,3 +151,37 @@ class BlogTestCase(JSONWebTokenTestCase):
             response.data["deleteBlog"]["verificationMessage"]
             == "Blog has been deleted."
         )
+
+    def test_anonymous_query_cache(self):
+        client = Client()
+        query = """
+            query getBlogDetail($id: String!) {
+                getBlogDetail(id: $id){
+                    name
+                }
+            }
+            """
+
+        def execute(**headers):
+            response = client.post(
+                "/graphql",
+                {"query": query, "variables": {"id": str(self.blog.id)}},
+                content_type="application/json",
+                **headers,
+            )
+            return response.json()["data"]["getBlogDetail"]["name"]
+
+        assert execute() == self.blog.name
+        # The same query with other whitespace is the same document
+        query = " ".join(query.split())
+        with CaptureQueriesContext(connection) as queries:
+            assert execute() == self.blog.name
+        assert not any("blog_blog" in q["sql"] for q in queries)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blog.name = "Renamed"
+            self.blog.save()
+        assert execute() == "Renamed"
+        # Authenticated requests never read the cache
+        with CaptureQueriesContext(connection) as queries:
+            execute(HTTP_AUTHORIZATION=f"JWT {get_token(self.user)}")
+        assert any("blog_blog" in q["sql"] for q in queries)
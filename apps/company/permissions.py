@@ -1,23 +1,93 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import Q
+
+import apps.data.constants as C
+from apps.company.models import Company
+
+
+def _access_key(user_id):
+    return f"company_access:{user_id}"
+
+
+def invalidate_company_access(user_ids):
+    """
+    Drop the access index of the users once the transaction commits, so a
+    concurrent check can not cache the access from before the change
+    """
+    keys = [_access_key(user_id) for user_id in user_ids if user_id]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _build_company_access(user):
+    access = {}
+    companies = (
+        Company.objects.filter(Q(administrator=user) | Q(invited_users=user))
+        .values_list("id", "administrator_id")
+        .distinct()
+    )
+    for company_id, administrator_id in companies:
+        access[str(company_id)] = (
+            C.COMPANY_ROLE_ADMINISTRATOR
+            if administrator_id == user.pk
+            else C.COMPANY_ROLE_INVITED_USER
+        )
+    return access
+
+
+def get_company_access(user):
+    """
+    The companies the user may access as {company id: role}, answered from
+    the request user, the cache or a single query in that order
+    """
+    if user.pk is None:
+        return {}
+    access = getattr(user, "_company_access", None)
+    if access is None:
+        access = cache.get(_access_key(user.pk))
+        if access is None:
+            access = _build_company_access(user)
+            cache.set(
+                _access_key(user.pk),
+                access,
+                settings.COMPANY_ACCESS_CACHE_TIMEOUT,
+            )
+        # The request user object lives as long as the request does
+        setattr(user, "_company_access", access)
+    return access
+
+
+def accessible_company_ids(user, role=None):
+    """
+    Ids of the companies the user may access, for company_id__in filters
+    """
+    return [
+        company_id
+        for company_id, company_role in get_company_access(user).items()
+        if role is None or company_role == role
+    ]
+
+
+def _company_role(user, company):
+    # Both company instances and company ids are accepted
+    company_id = getattr(company, "pk", company)
+    return get_company_access(user).get(str(company_id))
 
 
 def is_company_administrator(user, company):
-    if not user == company.administrator:
+    if _company_role(user, company) != C.COMPANY_ROLE_ADMINISTRATOR:
         raise PermissionDenied("You are not the company administrator.")
 
 
 def is_company_invited_users(user, company):
-    if user not in company.invited_users.all():
+    if _company_role(user, company) != C.COMPANY_ROLE_INVITED_USER:
         raise PermissionDenied("You are not invited to this company.")
 
 
 def is_company_administrator_or_invited_user(user, company):
-    print(not user == company.administrator)
-    print(user not in company.invited_users.all())
-    if (
-        not user == company.administrator
-        and user not in company.invited_users.all()
-    ):
+    if _company_role(user, company) is None:
         raise PermissionDenied(
             "You are not the company administrator or invited user."
         )
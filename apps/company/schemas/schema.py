@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from graphene_django import DjangoObjectType
 from graphql_jwt.decorators import login_required, permission_required
 
+from apps.base.selections import optimize_queryset
 from apps.company.models import Company
 from apps.company.permissions import (is_company_administrator,
                                       is_company_administrator_or_invited_user)
@@ -12,7 +13,7 @@ from apps.mail.tasks import send_email
 class CompanyType(DjangoObjectType):
     class Meta:
         model = Company
-        fields = "__all__"
+        exclude = ["exportjob_set", "importjob_set"]
 
 
 class Query(graphene.ObjectType):
@@ -30,7 +31,9 @@ class Query(graphene.ObjectType):
     @login_required
     @permission_required("company.view_company")
     def resolve_get_company_by_id(self, info, id):
-        company = Company.objects.filter(id=id).first()
+        company = optimize_queryset(
+            Company.objects.filter(id=id), info
+        ).first()
         is_company_administrator_or_invited_user(info.context.user, company)
         return company
 
@@ -38,13 +41,13 @@ class Query(graphene.ObjectType):
     @permission_required("company.view_company")
     def resolve_get_companies_by_administrator_id(self, info, id):
         company = Company.objects.filter(administrator_id=id).order_by("-id")
-        return company
+        return optimize_queryset(company, info)
 
     @login_required
     @permission_required("company.view_company")
     def resolve_get_companies_by_user_id(self, info, id):
         company = Company.objects.filter(invited_users__id=id).order_by("-id")
-        return company
+        return optimize_queryset(company, info)
 
     @login_required
     @permission_required("company.view_company")
@@ -54,7 +57,7 @@ class Query(graphene.ObjectType):
                 name__icontains=name, is_administrator=info.context.user
             ).order_by("-id")
         company = Company.objects.all().order_by("-id")
-        return company
+        return optimize_queryset(company, info)
 
 
 class CreateCompany(graphene.Mutation):
@@ -0,0 +1,51 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from apps.company.models import Company
+from apps.company.permissions import invalidate_company_access
+
+
+@receiver(pre_save, sender=Company)
+def remember_administrator(sender, instance, **kwargs):
+    instance._previous_administrator_id = (
+        Company.objects.filter(pk=instance.pk)
+        .values_list("administrator_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Company)
+def administrator_changed(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_administrator_id", None)
+    if previous != instance.administrator_id:
+        invalidate_company_access([previous, instance.administrator_id])
+
+
+@receiver(pre_delete, sender=Company)
+def remember_members(sender, instance, **kwargs):
+    # The invites are deleted along with the company without m2m signals
+    instance._member_ids = [
+        instance.administrator_id,
+        *instance.invited_users.values_list("pk", flat=True),
+    ]
+
+
+@receiver(post_delete, sender=Company)
+def company_deleted(sender, instance, **kwargs):
+    invalidate_company_access(getattr(instance, "_member_ids", []))
+
+
+@receiver(m2m_changed, sender=Company.invited_users.through)
+def invited_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # The affected users of a clear are only known before the clear
+    if action == "pre_clear":
+        instance._cleared_user_ids = (
+            [instance.pk]
+            if reverse
+            else list(instance.invited_users.values_list("pk", flat=True))
+        )
+    elif action == "post_clear":
+        invalidate_company_access(getattr(instance, "_cleared_user_ids", []))
+    elif action in ("post_add", "post_remove"):
+        invalidate_company_access([instance.pk] if reverse else pk_set)
@@ -1,9 +1,15 @@
 from unittest import mock
 
 import pytest
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.core.exceptions import PermissionDenied
 from graphql_jwt.testcases import JSONWebTokenTestCase
 
+import apps.data.constants as C
+from apps.company.permissions import (accessible_company_ids,
+                                      get_company_access,
+                                      is_company_administrator_or_invited_user)
 from apps.company.tests.factories import CompanyFactory
 from apps.users.tests.factories import UserFactory
 
@@ -152,3 +158,41 @@ class CompanyTestCase(JSONWebTokenTestCase):
             == "User with test@templatesx.io has been "
             f"invited to {self.company.name}."
         )
+
+    def test_company_membership_is_cached(self):
+        user = UserFactory()
+        with self.assertRaises(PermissionDenied):
+            is_company_administrator_or_invited_user(user, self.company)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.invited_users.add(user)
+        user = get_user_model().objects.get(pk=user.pk)
+        with self.assertNumQueries(1):
+            is_company_administrator_or_invited_user(user, self.company)
+        other_request_user = get_user_model().objects.get(pk=user.pk)
+        with self.assertNumQueries(0):
+            is_company_administrator_or_invited_user(user, self.company)
+            is_company_administrator_or_invited_user(
+                other_request_user, self.company
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            user.invited_users.clear()
+        with self.assertRaises(PermissionDenied):
+            is_company_administrator_or_invited_user(
+                get_user_model().objects.get(pk=user.pk), self.company
+            )
+
+    def test_company_access_follows_administrator(self):
+        other = CompanyFactory()
+        assert str(other.id) not in get_company_access(self.administrator)
+        other.administrator = self.administrator
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            other.save(update_fields=["administrator"])
+            # The stale access stays until the change is committed
+            assert str(other.id) not in get_company_access(
+                get_user_model().objects.get(pk=self.administrator.pk)
+            )
+        assert callbacks
+        user = get_user_model().objects.get(pk=self.administrator.pk)
+        assert str(other.id) in accessible_company_ids(
+            user, C.COMPANY_ROLE_ADMINISTRATOR
+        )
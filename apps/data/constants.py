@@ -5,3 +5,41 @@ STORAGE_TYPES = [
     (STORAGE_TYPE_GOOGLE, "Google Cloud Storage"),
     (STORAGE_TYPE_AWS, "Amazon S3"),
 ]
+
+EXPORT_TYPE_PDF = "pdf"
+EXPORT_TYPE_PNG = "png"
+EXPORT_TYPE_DOCX = "docx"
+EXPORT_TYPE_JPEG = "jpeg"
+
+EXPORT_TYPES = [
+    (EXPORT_TYPE_PDF, "PDF"),
+    (EXPORT_TYPE_PNG, "PNG"),
+    (EXPORT_TYPE_DOCX, "Word document"),
+    (EXPORT_TYPE_JPEG, "JPEG"),
+]
+
+JOB_STATUS_PENDING = "pending"
+JOB_STATUS_STARTED = "started"
+JOB_STATUS_SUCCESS = "success"
+JOB_STATUS_FAILURE = "failure"
+
+JOB_STATUSES = [
+    (JOB_STATUS_PENDING, "Pending"),
+    (JOB_STATUS_STARTED, "Started"),
+    (JOB_STATUS_SUCCESS, "Success"),
+    (JOB_STATUS_FAILURE, "Failure"),
+]
+
+COMPANY_ROLE_ADMINISTRATOR = "administrator"
+COMPANY_ROLE_INVITED_USER = "invited_user"
+
+DELETE_STATUS_DELETED = "deleted"
+DELETE_STATUS_NOT_FOUND = "not_found"
+
+GALLERY_FACET_CATEGORY = "category"
+GALLERY_FACET_COMPANY = "company"
+
+GALLERY_FACETS = [
+    (GALLERY_FACET_CATEGORY, "Category"),
+    (GALLERY_FACET_COMPANY, "Company"),
+]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mail", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="emailtemplate",
+            index=models.Index(
+                fields=["key_name"], name="emailtemplate_key_name_idx"
+            ),
+        ),
+    ]
@@ -7,3 +7,10 @@ class EmailTemplate(Base):
     key_name = models.CharField(max_length=255, null=True, blank=True)
     title = models.CharField(max_length=255, null=True, blank=True)
     template = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["key_name"], name="emailtemplate_key_name_idx"
+            )
+        ]
@@ -60,6 +60,20 @@ def upload_file_external(session, bucket_name, path, object_name):
     return s3_url
 
 
+def upload_fileobj_external(session, bucket_name, fileobj, object_name):
+    s3_resource = session.resource("s3")
+    original_path = object_name
+    if original_path.startswith("/"):
+        original_path = original_path[1:]
+    bucket = s3_resource.Bucket(bucket_name)
+    bucket.upload_fileobj(
+        Fileobj=fileobj, Key=original_path, ExtraArgs={"ACL": "public-read"}
+    )
+
+    s3_url = f"https://{bucket_name}.s3.amazonaws.com/{original_path}"
+    return s3_url
+
+
 def download_file(bucket_name, key, path):
     session = init_session()
     s3_resource = session.resource("s3")
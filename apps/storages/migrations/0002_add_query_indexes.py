@@ -0,0 +1,20 @@
+# Generated by Django 4.1 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("storages", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="storage",
+            index=models.Index(
+                fields=["company", "is_selected"],
+                name="storage_company_selected_idx",
+            ),
+        ),
+    ]
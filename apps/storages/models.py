@@ -33,3 +33,12 @@ class Storage(Base):
 
     def __str__(self):
         return self.storage_type
+
+    class Meta:
+        indexes = [
+            # The selected storage of a company
+            models.Index(
+                fields=["company", "is_selected"],
+                name="storage_company_selected_idx",
+            )
+        ]
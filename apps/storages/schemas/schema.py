@@ -28,9 +28,7 @@ class Query(graphene.ObjectType):
     @login_required
     @permission_required("storages.view_storage")
     def resolve_get_company_storages(self, info, id, **kwargs):
-        is_company_administrator(
-            info.context.user, Company.objects.filter(id=id).first()
-        )
+        is_company_administrator(info.context.user, id)
         return Storage.objects.filter(company_id=id)
 
 
@@ -59,9 +57,7 @@ class CreateStorage(graphene.Mutation):
     def mutate(self, info, **kwargs):
         storage_type = kwargs.get("storage_type")
         company = kwargs.get("company")
-        is_company_administrator(
-            info.context.user, Company.objects.filter(id=company).first()
-        )
+        is_company_administrator(info.context.user, company)
         is_selected = kwargs.get("is_selected", False)
         if is_selected:
             Storage.objects.filter(company_id=company).update(
@@ -131,9 +127,7 @@ class UpdateStorage(graphene.Mutation):
         id = kwargs.get("id")
         storage_type = kwargs.get("storage_type")
         company = kwargs.get("company")
-        is_company_administrator(
-            info.context.user, Company.objects.filter(id=company).first()
-        )
+        is_company_administrator(info.context.user, company)
         is_selected = kwargs.get("is_selected", False)
         if is_selected:
             Storage.objects.filter(company_id=company).update(
@@ -205,7 +199,7 @@ class SelectStorage(graphene.Mutation):
     def mutate(self, info, **kwargs):
         id = kwargs.get("id")
         storage = Storage.objects.filter(id=id).first()
-        is_company_administrator(info.context.user, storage.company)
+        is_company_administrator(info.context.user, storage.company_id)
         if storage:
             Storage.objects.filter(company_id=storage.company).update(
                 is_selected=False
@@ -232,7 +226,7 @@ class DeleteStorage(graphene.Mutation):
     def mutate(self, info, **kwargs):
         id = kwargs.get("id")
         storage = Storage.objects.filter(id=id).first()
-        is_company_administrator(info.context.user, storage.company)
+        is_company_administrator(info.context.user, storage.company_id)
         if storage:
             storage.delete()
 
@@ -162,3 +162,9 @@ class StorageTestCase(JSONWebTokenTestCase):
             response.data["selectStorage"]["verificationMessage"]
             == "Storage (de)selected successfully"
         )
+
+    def test_selected_storage_query_uses_index(self):
+        plan = Storage.objects.filter(
+            company_id=self.company.id, is_selected=True
+        ).explain()
+        assert "storage_company_selected_idx" in plan
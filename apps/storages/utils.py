@@ -0,0 +1,38 @@
+from django.core.files import File
+from django.core.files.storage import default_storage
+from google.cloud import storage as google_storage
+
+import apps.data.constants as C
+from apps.s3.file_handling import (init_external_session,
+                                   upload_fileobj_external)
+from apps.storages.models import Storage
+
+
+def get_selected_storage(company):
+    return Storage.objects.filter(company_id=company, is_selected=True).first()
+
+
+def upload_to_storage(storage, file, name):
+    """
+    Stream a file object under the relative name to the storage and return
+    its public url
+    """
+    file.seek(0)
+    if storage and storage.storage_type == C.STORAGE_TYPE_GOOGLE:
+        storage_client = google_storage.Client.from_service_account_json(
+            storage.auth_file.path
+        )
+        bucket = storage_client.get_bucket(storage.bucket_name)
+        blob = bucket.blob(name)
+        blob.upload_from_file(file)
+        return blob.public_url
+    if storage and storage.storage_type == C.STORAGE_TYPE_AWS:
+        session = init_external_session(
+            storage.access_key, storage.secret_key, storage.region
+        )
+        return upload_fileobj_external(
+            session, storage.bucket_name, file, f"/templatesx/{name}"
+        )
+    # Companies without a selected storage keep their files in media
+    name = default_storage.save(name, File(file))
+    return default_storage.url(name)
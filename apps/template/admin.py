@@ -1,6 +1,63 @@
+from django import forms
 from django.contrib import admin
 
-from apps.template.models import Template, TemplateCategory
+from apps.template.models import (BODY_FIELDS, ExportFile, ExportJob,
+                                  ImportJob, Template, TemplateBody,
+                                  TemplateCategory, TemplateRevision)
+
+
+class TemplateAdminForm(forms.ModelForm):
+    """
+    Edits the html and json of the template, saving points the template at
+    the body of the new contents instead of changing the shared body
+    """
+
+    content_html = forms.CharField(widget=forms.Textarea, required=False)
+    content_json = forms.CharField(widget=forms.Textarea, required=False)
+
+    class Meta:
+        model = Template
+        exclude = ["body"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in BODY_FIELDS:
+            self.fields[field].initial = getattr(self.instance, field)
+
+    def save(self, commit=True):
+        for field in BODY_FIELDS:
+            if field in self.changed_data:
+                setattr(self.instance, field, self.cleaned_data[field])
+        return super().save(commit)
+
+
+@admin.register(Template)
+class TemplateAdmin(admin.ModelAdmin):
+    form = TemplateAdminForm
+    readonly_fields = ["body"]
+
+
+@admin.register(TemplateBody)
+class TemplateBodyAdmin(admin.ModelAdmin):
+    """
+    Bodies are content addressed and shared between templates, editing one
+    in place would change every template pointing at it
+    """
+
+    list_display = ["digest", "date_created"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
-admin.site.register(Template)
 admin.site.register(TemplateCategory)
+admin.site.register(TemplateRevision)
+admin.site.register(ExportJob)
+admin.site.register(ExportFile)
+admin.site.register(ImportJob)
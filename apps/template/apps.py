@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TemplateConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.template"
+
+    def ready(self):
+        import apps.template.signals  # noqa: F401
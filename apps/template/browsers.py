@@ -0,0 +1,230 @@
+"""
+Headless Chrome kept running for png and jpeg screenshots
+
+Starting Chrome costs more than taking the screenshot, so every process
+keeps one browser and drives it over the DevTools protocol on a pipe
+(--remote-debugging-pipe), with a fresh page per screenshot. Inside the
+render sandbox the browser is in the process group of its worker, so the
+sandbox pool caps the browsers at WORKERS and recycles them with their
+worker after MAX_TASKS renders. A browser that died, timed out or failed a
+command is replaced on the next screenshot.
+"""
+import atexit
+import base64
+import fcntl
+import json
+import os
+import select
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from html2image.browsers.chrome import ChromeHeadless
+
+
+class BrowserError(Exception):
+    pass
+
+
+def _above_chrome_fds(fd):
+    # Above 4 and closed on exec, so only the copies on 3 and 4 reach chrome
+    moved = fcntl.fcntl(fd, fcntl.F_DUPFD_CLOEXEC, 5)
+    os.close(fd)
+    return moved
+
+
+class HeadlessBrowser:
+    """
+    A headless Chrome reading DevTools commands on fd 3 and answering on
+    fd 4, every message is json followed by a NUL byte
+    """
+
+    def __init__(self, executable=None):
+        # Found and flagged the way html2image screenshots are taken
+        chrome = ChromeHeadless(executable=executable)
+        self.profile = tempfile.mkdtemp(prefix="chrome-")
+        commands_read, commands_write = os.pipe()
+        answers_read, answers_write = os.pipe()
+        commands_read = _above_chrome_fds(commands_read)
+        answers_write = _above_chrome_fds(answers_write)
+        self.process = subprocess.Popen(
+            [
+                chrome.executable,
+                "--headless",
+                "--remote-debugging-pipe",
+                f"--user-data-dir={self.profile}",
+                *chrome.flags,
+                "about:blank",
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            # Other fds are not inheritable, closing them would close 3 and 4
+            close_fds=False,
+            preexec_fn=lambda: (
+                os.dup2(commands_read, 3),
+                os.dup2(answers_write, 4),
+            ),
+        )
+        os.close(commands_read)
+        os.close(answers_write)
+        self.commands = os.fdopen(commands_write, "wb")
+        self.answers = answers_read
+        self.buffer = b""
+        self.events = []
+        self.last_id = 0
+        self.renders = 0
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def receive(self, deadline):
+        while b"\0" not in self.buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise BrowserError("Screenshot timed out.")
+            ready, _, _ = select.select([self.answers], [], [], remaining)
+            if ready:
+                chunk = os.read(self.answers, 65536)
+                if not chunk:
+                    raise BrowserError("Browser exited.")
+                self.buffer += chunk
+        message, _, self.buffer = self.buffer.partition(b"\0")
+        return json.loads(message)
+
+    def send(self, method, params=None, session_id=None, *, deadline):
+        """
+        Send a command and wait for its result, events received meanwhile
+        are kept for wait_for
+        """
+        self.last_id += 1
+        message = {
+            "id": self.last_id,
+            "method": method,
+            "params": params or {},
+        }
+        if session_id:
+            message["sessionId"] = session_id
+        try:
+            self.commands.write(json.dumps(message).encode("utf-8") + b"\0")
+            self.commands.flush()
+        except BrokenPipeError:
+            raise BrowserError("Browser exited.")
+        while True:
+            answer = self.receive(deadline)
+            if answer.get("id") != self.last_id:
+                self.events.append(answer)
+            elif "error" in answer:
+                raise BrowserError(answer["error"].get("message", method))
+            else:
+                return answer.get("result", {})
+
+    def wait_for(self, method, session_id, deadline):
+        while True:
+            for event in self.events:
+                if (
+                    event.get("method") == method
+                    and event.get("sessionId") == session_id
+                ):
+                    self.events.remove(event)
+                    return event.get("params", {})
+            self.events.append(self.receive(deadline))
+
+    def screenshot(self, path, size, timeout):
+        """
+        Load the html file in a new page of the given size and return the
+        png of it
+        """
+        deadline = time.monotonic() + timeout
+        self.events = []
+        target = self.send(
+            "Target.createTarget", {"url": "about:blank"}, deadline=deadline
+        )["targetId"]
+        session = self.send(
+            "Target.attachToTarget",
+            {"targetId": target, "flatten": True},
+            deadline=deadline,
+        )["sessionId"]
+        for method, params in [
+            (
+                "Emulation.setDeviceMetricsOverride",
+                {
+                    "width": size[0],
+                    "height": size[1],
+                    "deviceScaleFactor": 1,
+                    "mobile": False,
+                },
+            ),
+            # Transparent like --default-background-color=0
+            (
+                "Emulation.setDefaultBackgroundColorOverride",
+                {"color": {"r": 0, "g": 0, "b": 0, "a": 0}},
+            ),
+            ("Page.enable", {}),
+            ("Page.navigate", {"url": Path(path).as_uri()}),
+        ]:
+            self.send(method, params, session, deadline=deadline)
+        self.wait_for("Page.loadEventFired", session, deadline)
+        data = self.send(
+            "Page.captureScreenshot",
+            {"format": "png"},
+            session,
+            deadline=deadline,
+        )["data"]
+        # A failed screenshot replaces the whole browser, pages included
+        self.send(
+            "Target.closeTarget", {"targetId": target}, deadline=deadline
+        )
+        self.renders += 1
+        return base64.b64decode(data)
+
+    def close(self):
+        self.commands.close()
+        os.close(self.answers)
+        self.process.kill()
+        self.process.wait()
+        shutil.rmtree(self.profile, ignore_errors=True)
+
+
+_browser = None
+_browser_pid = None
+_browser_lock = threading.Lock()
+
+
+def close_browser():
+    global _browser
+    if _browser is not None and _browser_pid == os.getpid():
+        _browser.close()
+    _browser = None
+
+
+atexit.register(close_browser)
+
+
+def take_screenshot(path, size):
+    """
+    Screenshot the html file with the browser of the current process, a
+    browser that died or took MAX_TASKS screenshots is replaced first
+    """
+    global _browser, _browser_pid
+    config = settings.TEMPLATE_RENDER_SANDBOX
+    # One page at a time, renders outside the sandbox may run in threads
+    with _browser_lock:
+        # Forked processes start their own browser instead of the parent's
+        if _browser_pid != os.getpid():
+            _browser = None
+        if _browser is not None and (
+            not _browser.is_alive() or _browser.renders >= config["MAX_TASKS"]
+        ):
+            close_browser()
+        if _browser is None:
+            _browser = HeadlessBrowser()
+            _browser_pid = os.getpid()
+        try:
+            return _browser.screenshot(path, size, config["TIMEOUT"])
+        except Exception:
+            close_browser()
+            raise
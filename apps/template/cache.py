@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import suppress
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def render_key(content_html, file_type, options=None):
+    """
+    Content address of a render, identical html renders to identical files
+    """
+    payload = json.dumps(
+        [content_html, file_type, options or {}], sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheRenderCache:
+    """
+    Keeps renders in a django cache, eviction is left to the cache itself
+    (allkeys-lru on redis) and hits refresh the timeout of the entry
+    """
+
+    def __init__(self, config):
+        self.cache = caches[config["CACHE_ALIAS"]]
+        self.timeout = config["TIMEOUT"]
+        self.max_entry_size = config["MAX_ENTRY_SIZE"]
+
+    def get(self, key):
+        data = self.cache.get(f"render:{key}")
+        if data is not None:
+            self.cache.touch(f"render:{key}", self.timeout)
+        return data
+
+    def set(self, key, data):
+        if len(data) > self.max_entry_size:
+            return False
+        self.cache.set(f"render:{key}", data, self.timeout)
+        return True
+
+    def delete(self, key):
+        self.cache.delete(f"render:{key}")
+
+
+class DiskRenderCache:
+    """
+    Keeps renders as files, the least recently used files are removed once
+    the directory grows over MAX_SIZE; the directory is only walked after
+    every EVICT_AFTER bytes a process writes
+    """
+
+    # Writes that crashed before their rename leave their temporary file
+    STALE_TEMPORARY_AGE = 60 * 60
+
+    def __init__(self, config):
+        self.location = config["LOCATION"]
+        self.max_size = config["MAX_SIZE"]
+        self.max_entry_size = config["MAX_ENTRY_SIZE"]
+        self.evict_after = config["EVICT_AFTER"]
+        self.written = 0
+
+    def path(self, key):
+        return os.path.join(self.location, key[:2], key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            # The modification time doubles as the last access time
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, key, data):
+        if len(data) > self.max_entry_size:
+            return False
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Every writer has its own temporary file, the rename is atomic
+        fd, temporary = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.remove(temporary)
+            raise
+        self.written += len(data)
+        if self.written >= self.evict_after:
+            self.evict()
+        return True
+
+    def delete(self, key):
+        with suppress(FileNotFoundError):
+            os.remove(self.path(key))
+
+    def evict(self):
+        """
+        Remove the least recently used files over MAX_SIZE, files other
+        processes remove meanwhile are skipped
+        """
+        self.written = 0
+        stale = time.time() - self.STALE_TEMPORARY_AGE
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.location):
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                if name.endswith(".tmp") and stat.st_mtime > stale:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, root, name))
+                total += stat.st_size
+        if total <= self.max_size:
+            return
+        entries.sort()
+        for _, size, root, name in entries:
+            if total <= self.max_size:
+                break
+            with suppress(FileNotFoundError):
+                os.remove(os.path.join(root, name))
+            total -= size
+
+
+BACKENDS = {
+    "cache": CacheRenderCache,
+    "disk": DiskRenderCache,
+}
+
+_render_cache = None
+_render_cache_config = None
+
+
+def get_render_cache():
+    """
+    The render cache of TEMPLATE_RENDER_CACHE, rebuilt when the setting is
+    replaced (e.g. by override_settings)
+    """
+    global _render_cache, _render_cache_config
+    config = settings.TEMPLATE_RENDER_CACHE
+    if _render_cache is None or _render_cache_config is not config:
+        _render_cache = BACKENDS[config["BACKEND"]](config)
+        _render_cache_config = config
+    return _render_cache
+
+
+def _template_index_key(template_id):
+    return f"render_cache:template:{template_id}"
+
+
+def remember_template_render(template_id, key):
+    index = caches["default"].get(_template_index_key(template_id), [])
+    if key not in index:
+        index.append(key)
+        caches["default"].set(_template_index_key(template_id), index, None)
+
+
+def invalidate_template_renders(template_id):
+    """
+    Drop every cached render of the template, called when its html changes
+    """
+    render_cache = get_render_cache()
+    index_key = _template_index_key(template_id)
+    for key in caches["default"].get(index_key, []):
+        render_cache.delete(key)
+    caches["default"].delete(index_key)
@@ -0,0 +1,169 @@
+"""
+Materialized feed of the public template gallery
+
+The gallery is kept in the cache as the ordered ids of its templates,
+oldest first and split in chunks, next to a slim card per template. Pages
+of getPublicTemplates that only select card fields are served from it
+without a database query. Cards are updated as soon as a template changes,
+the ordered ids are rebuilt by the rebuild_gallery_feed task.
+"""
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.base.pagination import decode_cursor
+from apps.template.models import Template
+
+FEED_KEY = "gallery:feed"
+CARD_FIELDS = (
+    "id",
+    "name",
+    "summary",
+    "screenshot",
+    "thumbnails",
+    "company_id",
+    "date_created",
+    "is_public",
+    "is_approved",
+)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _card_key(template_id):
+    return f"gallery:card:{template_id}"
+
+
+def _chunk_key(version, number):
+    return f"{FEED_KEY}:{version}:{number}"
+
+
+def _position(date_created, id):
+    # The (date_created, id) order of the listings, as sortable values
+    return (
+        (date_created - EPOCH) // timedelta(microseconds=1),
+        uuid.UUID(str(id)).hex,
+    )
+
+
+def _card(template):
+    card = {field: getattr(template, field) for field in CARD_FIELDS}
+    card["id"] = str(card["id"])
+    return card
+
+
+def update_gallery_card(template):
+    """
+    Store the card of a gallery template or drop the card of a template
+    that left the gallery, returns whether the feed has to be rebuilt
+    """
+    if template.is_public and template.is_approved:
+        cache.set(_card_key(template.pk), _card(template), None)
+        return True
+    return cache.delete(_card_key(template.pk))
+
+
+def remove_gallery_card(template_id):
+    return cache.delete(_card_key(template_id))
+
+
+def remove_gallery_cards(template_ids):
+    cache.delete_many([_card_key(template_id) for template_id in template_ids])
+
+
+def build_gallery_feed():
+    """
+    Rebuild the ordered ids and the cards of the gallery, readers switch
+    to the new feed at once when it is complete
+    """
+    chunk_size = settings.TEMPLATE_GALLERY_FEED["CHUNK_SIZE"]
+    version = uuid.uuid4().hex
+    templates = (
+        Template.objects.filter(is_public=True, is_approved=True)
+        .order_by("date_created", "id")
+        .only(*CARD_FIELDS)
+    )
+    boundaries = []
+    chunk = []
+    values = {}
+    count = 0
+    for template in templates.iterator(chunk_size=chunk_size):
+        chunk.append(_position(template.date_created, template.id))
+        values[_card_key(template.id)] = _card(template)
+        count += 1
+        if len(chunk) == chunk_size:
+            boundaries.append(chunk[0])
+            values[_chunk_key(version, len(boundaries) - 1)] = chunk
+            cache.set_many(values, None)
+            chunk, values = [], {}
+    if chunk:
+        boundaries.append(chunk[0])
+        values[_chunk_key(version, len(boundaries) - 1)] = chunk
+    cache.set_many(values, None)
+    previous = cache.get(FEED_KEY)
+    cache.set(
+        FEED_KEY,
+        {
+            "version": version,
+            "chunk_size": chunk_size,
+            "boundaries": boundaries,
+            "count": count,
+        },
+        None,
+    )
+    if previous:
+        cache.delete_many(
+            [
+                _chunk_key(previous["version"], number)
+                for number in range(len(previous["boundaries"]))
+            ]
+        )
+    return count
+
+
+def get_gallery_feed_page(size, after=None):
+    """
+    The (cards, has next page) of a gallery page newest first, None when
+    the feed is missing or incomplete and the database has to answer
+    """
+    feed = cache.get(FEED_KEY)
+    if feed is None:
+        return None
+    chunk_size = feed["chunk_size"]
+    chunks = {}
+
+    def load_chunks(numbers):
+        keys = {
+            _chunk_key(feed["version"], number): number for number in numbers
+        }
+        for key, chunk in cache.get_many(list(keys)).items():
+            chunks[keys[key]] = chunk
+        return all(number in chunks for number in numbers)
+
+    # Rows after the cursor are older, so they come before it in the feed
+    end = feed["count"]
+    if after:
+        position = _position(*decode_cursor(after))
+        number = bisect_right(feed["boundaries"], position) - 1
+        if number < 0:
+            end = 0
+        elif not load_chunks([number]):
+            return None
+        else:
+            end = number * chunk_size + bisect_left(chunks[number], position)
+    start = max(0, end - size - 1)
+    if end > start and not load_chunks(
+        range(start // chunk_size, (end - 1) // chunk_size + 1)
+    ):
+        return None
+    positions = [
+        chunks[index // chunk_size][index % chunk_size]
+        for index in range(end - 1, start - 1, -1)
+    ]
+    ids = [str(uuid.UUID(id)) for _, id in positions[:size]]
+    cards = cache.get_many([_card_key(id) for id in ids])
+    if len(cards) < len(ids):
+        return None
+    return [cards[_card_key(id)] for id in ids], len(positions) > size
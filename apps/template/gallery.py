@@ -0,0 +1,111 @@
+"""
+Category and company counts of the public template gallery
+
+The counts live in GalleryFacet rows. Whenever the search index of a
+template changes, the counts of the categories and companies it entered or
+left are recounted, so reading the facets is a lookup of the stored rows.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+import apps.data.constants as C
+from apps.base.models import bulk_upsert
+from apps.company.models import Company
+from apps.template.models import (GalleryFacet, Template, TemplateCategory,
+                                  TemplateSearchIndex)
+
+
+def gallery_facet_keys(rows):
+    """
+    The (category ids, company ids) counted for the given
+    (in_gallery, company_id, category_ids) index rows
+    """
+    category_ids, company_ids = set(), set()
+    for in_gallery, company_id, template_category_ids in rows:
+        if in_gallery:
+            company_ids.add(str(company_id))
+            category_ids.update(str(id) for id in template_category_ids)
+    return category_ids, company_ids
+
+
+def _category_counts(category_ids):
+    through = Template.categories.through
+    return (
+        through.objects.filter(
+            templatecategory_id__in=category_ids,
+            template__is_public=True,
+            template__is_approved=True,
+        )
+        .values_list("templatecategory_id")
+        .annotate(count=Count("template_id"))
+    )
+
+
+def _company_counts(company_ids):
+    return (
+        TemplateSearchIndex.objects.filter(
+            company_id__in=company_ids, in_gallery=True
+        )
+        .values_list("company_id")
+        .annotate(count=Count("pk"))
+    )
+
+
+def _replace_facets(kind, keys, counts):
+    """
+    Upsert the counted keys and drop the keys without gallery templates,
+    concurrent refreshes of a key update its row instead of inserting it
+    twice
+    """
+    counts = {str(key): count for key, count in counts}
+    # Rows are written in key order, so refreshes lock them in one order
+    bulk_upsert(
+        GalleryFacet,
+        [
+            GalleryFacet(kind=kind, key=key, count=counts[key])
+            for key in sorted(counts)
+        ],
+        ["kind", "key"],
+        ["count"],
+    )
+    empty = [key for key in keys if str(key) not in counts]
+    if empty:
+        GalleryFacet.objects.filter(kind=kind, key__in=empty).delete()
+
+
+def refresh_gallery_facets(category_ids=(), company_ids=()):
+    """
+    Recount the gallery templates of the given categories and companies,
+    only the affected keys are grouped and never the whole gallery
+    """
+    with transaction.atomic():
+        if category_ids:
+            _replace_facets(
+                C.GALLERY_FACET_CATEGORY,
+                category_ids,
+                _category_counts(category_ids),
+            )
+        if company_ids:
+            _replace_facets(
+                C.GALLERY_FACET_COMPANY,
+                company_ids,
+                _company_counts(company_ids),
+            )
+
+
+def get_gallery_facets(kind):
+    """
+    The [(id, name, count)] of a facet, largest first
+    """
+    facets = list(
+        GalleryFacet.objects.filter(kind=kind)
+        .order_by("-count")
+        .values_list("key", "count")
+    )
+    model = TemplateCategory if kind == C.GALLERY_FACET_CATEGORY else Company
+    names = dict(
+        model.objects.filter(id__in=[key for key, _ in facets]).values_list(
+            "id", "name"
+        )
+    )
+    return [(key, names[key], count) for key, count in facets if key in names]
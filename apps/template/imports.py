@@ -0,0 +1,81 @@
+"""
+Reading template libraries for bulk imports
+
+An import is either an NDJSON file with one template object per line or a
+ZIP archive of NDJSON files and single template .json files. Records are
+read one at a time, so the upload never has to fit in memory.
+"""
+import json
+import zipfile
+
+from apps.template.models import Template
+
+NDJSON_EXTENSIONS = (".ndjson", ".jsonl")
+
+
+def _lines(stream, source):
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            yield f"{source}:{number}", line
+
+
+def iter_import_records(file, name="upload"):
+    """
+    Yield (location, raw record) pairs from an NDJSON or ZIP file object
+    """
+    if not zipfile.is_zipfile(file):
+        file.seek(0)
+        yield from _lines(file, name)
+        return
+    file.seek(0)
+    with zipfile.ZipFile(file) as archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            with archive.open(member) as stream:
+                if member.filename.endswith(NDJSON_EXTENSIONS):
+                    yield from _lines(stream, member.filename)
+                elif member.filename.endswith(".json"):
+                    yield member.filename, stream.read()
+
+
+def parse_template_record(raw, company_id, categories):
+    """
+    Validate a raw record and build the unsaved template and the ids of
+    its categories, categories may be given by id or by name
+    """
+    try:
+        record = json.loads(raw)
+    except ValueError:
+        raise ValueError("Invalid JSON.")
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object.")
+    name = record.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("A name is required.")
+    max_length = Template._meta.get_field("name").max_length
+    if len(name) > max_length:
+        raise ValueError(f"The name is longer than {max_length} characters.")
+    for field in ("summary", "content_html"):
+        if not isinstance(record.get(field, ""), str):
+            raise ValueError(f"{field} must be a string.")
+    content_json = record.get("content_json", "")
+    if not isinstance(content_json, str):
+        content_json = json.dumps(content_json)
+    is_active = record.get("is_active", True)
+    if not isinstance(is_active, bool):
+        raise ValueError("is_active must be a boolean.")
+    category_ids = []
+    for category in record.get("categories") or []:
+        if str(category) not in categories:
+            raise ValueError(f"Unknown category {category}.")
+        category_ids.append(categories[str(category)])
+    template = Template(
+        company_id=company_id,
+        name=name,
+        summary=record.get("summary", ""),
+        content_html=record.get("content_html", ""),
+        content_json=content_json,
+        is_active=is_active,
+    )
+    return template, list(dict.fromkeys(category_ids))
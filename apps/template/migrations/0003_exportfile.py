@@ -0,0 +1,104 @@
+# Generated by Django 4.1 on 2026-10-18 10:44
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("template", "0002_exportjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExportFile",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Unique identification",
+                    ),
+                ),
+                (
+                    "date_created",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Date of creation"
+                    ),
+                ),
+                (
+                    "date_published",
+                    models.DateTimeField(
+                        blank=True,
+                        default=django.utils.timezone.now,
+                        null=True,
+                        verbose_name="Publishingdate",
+                    ),
+                ),
+                (
+                    "date_expired",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Expiring date"
+                    ),
+                ),
+                (
+                    "date_updated",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Date of last update"
+                    ),
+                ),
+                (
+                    "date_deleted",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Delete date"
+                    ),
+                ),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Draft"),
+                            ("in review", "In review"),
+                            ("published", "Published"),
+                            ("changes requested", "Changes requested"),
+                            ("schedule", "Schedule"),
+                        ],
+                        default="draft",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "file_type",
+                    models.CharField(
+                        choices=[
+                            ("pdf", "PDF"),
+                            ("png", "PNG"),
+                            ("docx", "Word document"),
+                            ("jpeg", "JPEG"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("file_url", models.CharField(blank=True, max_length=1024)),
+                (
+                    "job",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="files",
+                        to="template.exportjob",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Export File",
+                "verbose_name_plural": "Export Files",
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.1 on 2026-10-18 10:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("company", "0002_initial"),
+        ("template", "0003_exportfile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="company",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="company.company",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="exportjob",
+            name="template",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="template.template",
+            ),
+        ),
+    ]
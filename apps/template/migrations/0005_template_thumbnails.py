@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("template", "0004_exportjob_company"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="template",
+            name="thumbnails",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
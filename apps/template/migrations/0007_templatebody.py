@@ -0,0 +1,112 @@
+# Generated by Django 4.1 on 2026-10-18 11:05
+
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def _digest(content_html, content_json):
+    payload = json.dumps([content_html or "", content_json or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _pages(queryset):
+    """
+    The rows a page at a time by primary key, the mysql driver buffers a
+    whole result even when iterated in chunks
+    """
+    queryset = queryset.order_by("pk")
+    page = list(queryset[:BATCH_SIZE])
+    while page:
+        yield page
+        last = page[-1].pk
+        page = list(queryset.filter(pk__gt=last)[:BATCH_SIZE])
+
+
+def move_bodies(apps, schema_editor):
+    """
+    Move the html and json of every template into shared bodies, a page
+    at a time
+    """
+    Template = apps.get_model("template", "Template")
+    TemplateBody = apps.get_model("template", "TemplateBody")
+    templates = Template.objects.only("id", "content_html", "content_json")
+    for page in _pages(templates):
+        _attach_bodies(TemplateBody, Template, page)
+
+
+def _attach_bodies(TemplateBody, Template, templates):
+    bodies = {}
+    for template in templates:
+        template.body_id = _digest(
+            template.content_html, template.content_json
+        )
+        bodies[template.body_id] = TemplateBody(
+            digest=template.body_id,
+            content_html=template.content_html or "",
+            content_json=template.content_json or "",
+        )
+    TemplateBody.objects.bulk_create(bodies.values(), ignore_conflicts=True)
+    Template.objects.bulk_update(templates, ["body"])
+
+
+def restore_bodies(apps, schema_editor):
+    Template = apps.get_model("template", "Template")
+    templates = Template.objects.select_related("body").exclude(body=None)
+    for page in _pages(templates):
+        for template in page:
+            template.content_html = template.body.content_html
+            template.content_json = template.body.content_json
+        Template.objects.bulk_update(page, ["content_html", "content_json"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("template", "0006_importjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TemplateBody",
+            fields=[
+                (
+                    "digest",
+                    models.CharField(
+                        max_length=64, primary_key=True, serialize=False
+                    ),
+                ),
+                ("content_html", models.TextField(blank=True)),
+                ("content_json", models.TextField(blank=True)),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Template Body",
+                "verbose_name_plural": "Template Bodies",
+            },
+        ),
+        migrations.AddField(
+            model_name="template",
+            name="body",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="templates",
+                to="template.templatebody",
+            ),
+        ),
+        migrations.RunPython(move_bodies, restore_bodies),
+        migrations.RemoveField(
+            model_name="template",
+            name="content_html",
+        ),
+        migrations.RemoveField(
+            model_name="template",
+            name="content_json",
+        ),
+    ]
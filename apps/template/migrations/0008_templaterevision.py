@@ -0,0 +1,114 @@
+# Generated by Django 4.1 on 2026-10-18 11:09
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("template", "0007_templatebody"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TemplateRevision",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Unique identification",
+                    ),
+                ),
+                (
+                    "date_created",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Date of creation"
+                    ),
+                ),
+                (
+                    "date_published",
+                    models.DateTimeField(
+                        blank=True,
+                        default=django.utils.timezone.now,
+                        null=True,
+                        verbose_name="Publishingdate",
+                    ),
+                ),
+                (
+                    "date_expired",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Expiring date"
+                    ),
+                ),
+                (
+                    "date_updated",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Date of last update"
+                    ),
+                ),
+                (
+                    "date_deleted",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Delete date"
+                    ),
+                ),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Draft"),
+                            ("in review", "In review"),
+                            ("published", "Published"),
+                            ("changes requested", "Changes requested"),
+                            ("schedule", "Schedule"),
+                        ],
+                        default="draft",
+                        max_length=255,
+                    ),
+                ),
+                ("number", models.PositiveIntegerField()),
+                ("body_digest", models.CharField(max_length=64)),
+                ("is_snapshot", models.BooleanField(default=False)),
+                ("data", models.BinaryField()),
+                ("is_compacted", models.BooleanField(default=False)),
+                (
+                    "template",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="revisions",
+                        to="template.template",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Template Revision",
+                "verbose_name_plural": "Template Revisions",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="templaterevision",
+            constraint=models.UniqueConstraint(
+                fields=("template", "number"),
+                name="unique_template_revision_number",
+            ),
+        ),
+    ]
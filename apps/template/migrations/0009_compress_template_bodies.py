@@ -0,0 +1,72 @@
+# Generated by Django 4.1 on 2026-10-18 11:11
+
+from django.db import migrations, models
+from django.db.models import Value
+
+import apps.base.fields
+
+BATCH_SIZE = 500
+FIELDS = ("content_html", "content_json")
+
+
+def _pages(queryset):
+    """
+    The rows a page at a time by primary key, the mysql driver buffers a
+    whole result even when iterated in chunks
+    """
+    queryset = queryset.order_by("pk")
+    page = list(queryset[:BATCH_SIZE])
+    while page:
+        yield page
+        last = page[-1].pk
+        page = list(queryset.filter(pk__gt=last)[:BATCH_SIZE])
+
+
+def compress_bodies(apps, schema_editor):
+    """
+    Rewrite the bodies compressed, a page at a time, rows that are not
+    compressed yet are read as plain text
+    """
+    TemplateBody = apps.get_model("template", "TemplateBody")
+    for page in _pages(TemplateBody.objects.all()):
+        for body in page:
+            for field in FIELDS:
+                setattr(body, field, getattr(body, field))
+        TemplateBody.objects.bulk_update(page, FIELDS)
+
+
+def decompress_bodies(apps, schema_editor):
+    TemplateBody = apps.get_model("template", "TemplateBody")
+    for page in _pages(TemplateBody.objects.all()):
+        for body in page:
+            TemplateBody.objects.filter(pk=body.pk).update(
+                **{
+                    field: Value(getattr(body, field), models.TextField())
+                    for field in FIELDS
+                }
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("template", "0008_templaterevision"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="templatebody",
+            name="content_html",
+            field=apps.base.fields.CompressedTextField(
+                blank=True, editable=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="templatebody",
+            name="content_json",
+            field=apps.base.fields.CompressedTextField(
+                blank=True, editable=True
+            ),
+        ),
+        migrations.RunPython(compress_bodies, decompress_bodies),
+    ]
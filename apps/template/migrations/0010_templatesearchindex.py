@@ -0,0 +1,63 @@
+# Generated by Django 4.1 on 2026-10-18 11:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def add_fulltext_index(apps, schema_editor):
+    # Other databases search the documents without an index
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute(
+            "ALTER TABLE template_templatesearchindex "
+            "ADD FULLTEXT INDEX template_search_document (document)"
+        )
+
+
+def remove_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute(
+            "ALTER TABLE template_templatesearchindex "
+            "DROP INDEX template_search_document"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("company", "0002_initial"),
+        ("template", "0009_compress_template_bodies"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TemplateSearchIndex",
+            fields=[
+                (
+                    "template",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="template.template",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("in_gallery", models.BooleanField(default=False)),
+                ("date_created", models.DateTimeField()),
+                ("document", models.TextField(blank=True)),
+                (
+                    "company",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="company.company",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Template Search Index",
+                "verbose_name_plural": "Template Search Index",
+            },
+        ),
+        migrations.RunPython(add_fulltext_index, remove_fulltext_index),
+    ]
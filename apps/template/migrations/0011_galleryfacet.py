@@ -0,0 +1,54 @@
+# Generated by Django 4.1 on 2026-10-18 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("template", "0010_templatesearchindex"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GalleryFacet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("category", "Category"),
+                            ("company", "Company"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("key", models.UUIDField()),
+                ("count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Gallery Facet",
+                "verbose_name_plural": "Gallery Facets",
+            },
+        ),
+        migrations.AddField(
+            model_name="templatesearchindex",
+            name="category_ids",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddConstraint(
+            model_name="galleryfacet",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "key"), name="unique_gallery_facet"
+            ),
+        ),
+    ]
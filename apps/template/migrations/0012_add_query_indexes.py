@@ -0,0 +1,61 @@
+# Generated by Django 4.1 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("template", "0011_galleryfacet"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="galleryfacet",
+            index=models.Index(
+                fields=["kind", "count"], name="gallery_facet_count_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="template",
+            index=models.Index(
+                fields=["is_public", "is_approved", "date_created", "id"],
+                name="template_gallery_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="template",
+            index=models.Index(
+                fields=["company", "date_created", "id"],
+                name="template_company_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="templaterevision",
+            index=models.Index(
+                fields=["template", "is_snapshot", "number"],
+                name="revision_snapshot_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="templaterevision",
+            index=models.Index(
+                fields=["is_compacted", "date_created"],
+                name="revision_compaction_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="templatesearchindex",
+            index=models.Index(
+                fields=["company", "date_created"],
+                name="search_company_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="templatesearchindex",
+            index=models.Index(
+                fields=["in_gallery", "date_created"],
+                name="search_gallery_created_idx",
+            ),
+        ),
+    ]
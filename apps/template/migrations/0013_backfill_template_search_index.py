@@ -0,0 +1,101 @@
+# Generated by Django 4.1 on 2026-10-18 14:02
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+from apps.template.search import html_to_text
+
+BATCH_SIZE = 500
+
+
+def _pages(queryset):
+    """
+    The rows a page at a time by primary key, the mysql driver buffers a
+    whole result even when iterated in chunks
+    """
+    queryset = queryset.order_by("pk")
+    page = list(queryset[:BATCH_SIZE])
+    while page:
+        yield page
+        last = page[-1].pk
+        page = list(queryset.filter(pk__gt=last)[:BATCH_SIZE])
+
+
+def _index_row(TemplateSearchIndex, template):
+    max_length = settings.TEMPLATE_SEARCH_MAX_DOCUMENT_LENGTH
+    categories = list(template.categories.all())
+    document = "\n".join(
+        [
+            template.name,
+            template.summary or "",
+            " ".join(category.name for category in categories),
+            html_to_text(template.body.content_html if template.body else ""),
+        ]
+    )
+    return TemplateSearchIndex(
+        template_id=template.id,
+        company_id=template.company_id,
+        name=template.name,
+        in_gallery=template.is_public and template.is_approved,
+        date_created=template.date_created,
+        category_ids=[str(category.id) for category in categories],
+        document=document[:max_length],
+    )
+
+
+def index_templates(apps, schema_editor):
+    """
+    Index the existing templates a page at a time and count the gallery
+    facets once they are indexed, templates saved meanwhile are indexed by
+    their save
+    """
+    Template = apps.get_model("template", "Template")
+    TemplateSearchIndex = apps.get_model("template", "TemplateSearchIndex")
+    GalleryFacet = apps.get_model("template", "GalleryFacet")
+    templates = Template.objects.select_related("body").prefetch_related(
+        "categories"
+    )
+    for page in _pages(templates):
+        TemplateSearchIndex.objects.bulk_create(
+            [_index_row(TemplateSearchIndex, template) for template in page],
+            ignore_conflicts=True,
+        )
+    through = Template.categories.through
+    categories = (
+        through.objects.filter(
+            template__is_public=True, template__is_approved=True
+        )
+        .values_list("templatecategory_id")
+        .annotate(count=Count("template_id"))
+    )
+    companies = (
+        TemplateSearchIndex.objects.filter(in_gallery=True)
+        .values_list("company_id")
+        .annotate(count=Count("pk"))
+    )
+    GalleryFacet.objects.all().delete()
+    GalleryFacet.objects.bulk_create(
+        [
+            *(
+                GalleryFacet(kind="category", key=key, count=count)
+                for key, count in categories
+            ),
+            *(
+                GalleryFacet(kind="company", key=key, count=count)
+                for key, count in companies
+            ),
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("template", "0012_add_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(index_templates, migrations.RunPython.noop),
+    ]
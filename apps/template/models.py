@@ -1,8 +1,16 @@
+import hashlib
+import json
+
+from django.contrib.auth import get_user_model
 from django.db import models
 
-from apps.base.models import Base
+import apps.data.constants as C
+from apps.base.fields import CompressedTextField
+from apps.base.models import Base, bulk_upsert
 from apps.company.models import Company
 
+User = get_user_model()
+
 
 class TemplateCategory(Base):
     name = models.CharField(max_length=255)
@@ -16,17 +24,376 @@ class TemplateCategory(Base):
         verbose_name_plural = "Template Categories"
 
 
+def body_digest(content_html, content_json):
+    payload = json.dumps([content_html or "", content_json or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TemplateBody(models.Model):
+    """
+    Template html and json stored once per distinct content, templates with
+    identical bodies (e.g. copies) share one row
+    """
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    content_html = CompressedTextField(blank=True)
+    content_json = CompressedTextField(blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.digest
+
+    @classmethod
+    def attach(cls, templates):
+        """
+        Point templates with edited contents at their bodies, creating the
+        missing bodies with one insert
+        """
+        pending = {}
+        for template in templates:
+            contents = template.__dict__.get("_pending_body")
+            if contents is not None:
+                digest = body_digest(**contents)
+                pending.setdefault(digest, contents)
+                template.body_id = digest
+                template.__dict__.pop("_pending_body")
+        if pending:
+            # Existing bodies get a new date_created, which keeps the unused
+            # body cleanup from deleting a body that is being attached again
+            bulk_upsert(
+                cls,
+                [
+                    cls(digest=digest, **contents)
+                    for digest, contents in pending.items()
+                ],
+                ["digest"],
+                ["date_created"],
+            )
+
+    class Meta:
+        verbose_name = "Template Body"
+        verbose_name_plural = "Template Bodies"
+
+
+BODY_FIELDS = ("content_html", "content_json")
+
+
 class Template(Base):
     name = models.CharField(max_length=100)
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     summary = models.TextField(blank=True)
     screenshot = models.CharField(max_length=255, blank=True)
-    content_html = models.TextField(blank=True)
-    content_json = models.TextField(blank=True)
+    # Thumbnail urls by format and width, e.g. {"webp": {"320": "..."}}
+    thumbnails = models.JSONField(default=dict, blank=True)
+    # Html and json live in the shared body, see content_html/content_json
+    body = models.ForeignKey(
+        TemplateBody,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="templates",
+    )
     is_active = models.BooleanField(default=True)
     categories = models.ManyToManyField(TemplateCategory, blank=True)
     is_public = models.BooleanField(default=False)
     is_approved = models.BooleanField(default=False)
 
+    # Read through the body, GraphQL selections of them join it
+    RELATION_ATTRIBUTES = dict.fromkeys(BODY_FIELDS, "body")
+
+    def __str__(self):
+        return self.name
+
+    def _get_content(self, name):
+        pending = self.__dict__.get("_pending_body")
+        if pending is not None:
+            return pending[name]
+        return getattr(self.body, name) if self.body_id else ""
+
+    def _set_content(self, name, value):
+        contents = {field: self._get_content(field) for field in BODY_FIELDS}
+        contents[name] = value or ""
+        self.__dict__["_pending_body"] = contents
+
+    @property
+    def content_html(self):
+        return self._get_content("content_html")
+
+    @content_html.setter
+    def content_html(self, value):
+        self._set_content("content_html", value)
+
+    @property
+    def content_json(self):
+        return self._get_content("content_json")
+
+    @content_json.setter
+    def content_json(self, value):
+        self._set_content("content_json", value)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            fields = [
+                name for name in update_fields if name not in BODY_FIELDS
+            ]
+            if len(fields) < len(update_fields):
+                fields.append("body")
+            kwargs["update_fields"] = fields
+        if self.body_id is None and "_pending_body" not in self.__dict__:
+            self.content_html = ""
+        if "_pending_body" in self.__dict__:
+            contents = self.__dict__["_pending_body"]
+            self.body, _ = TemplateBody.objects.get_or_create(
+                digest=body_digest(**contents), defaults=contents
+            )
+            self.__dict__.pop("_pending_body")
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            # The public gallery, newest first
+            models.Index(
+                fields=["is_public", "is_approved", "date_created", "id"],
+                name="template_gallery_idx",
+            ),
+            # The template listings of companies, newest first
+            models.Index(
+                fields=["company", "date_created", "id"],
+                name="template_company_created_idx",
+            ),
+        ]
+
+
+class TemplateRevision(Base):
+    """
+    A saved state of the template body, see apps.template.revisions
+    """
+
+    template = models.ForeignKey(
+        Template, on_delete=models.CASCADE, related_name="revisions"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    number = models.PositiveIntegerField()
+    body_digest = models.CharField(max_length=64)
+    # Snapshots hold the full body, other revisions the edits since the
+    # previous revision; both as zlib compressed json
+    is_snapshot = models.BooleanField(default=False)
+    data = models.BinaryField()
+    is_compacted = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.template_id} #{self.number}"
+
+    class Meta:
+        verbose_name = "Template Revision"
+        verbose_name_plural = "Template Revisions"
+        indexes = [
+            # The closest snapshot before a revision
+            models.Index(
+                fields=["template", "is_snapshot", "number"],
+                name="revision_snapshot_idx",
+            ),
+            models.Index(
+                fields=["is_compacted", "date_created"],
+                name="revision_compaction_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["template", "number"],
+                name="unique_template_revision_number",
+            )
+        ]
+
+
+class TemplateSearchIndex(models.Model):
+    """
+    Searchable text of a template, see apps.template.search
+    """
+
+    template = models.OneToOneField(
+        Template,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_index",
+    )
+    # Copies of the template fields searches are filtered and ranked on,
+    # so a search never joins the templates table
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+    in_gallery = models.BooleanField(default=False)
+    date_created = models.DateTimeField()
+    # The categories as indexed, the gallery counts of categories a
+    # template leaves are refreshed from them
+    category_ids = models.JSONField(default=list, blank=True)
+    # Name, summary, category names and the text of the html, covered by a
+    # FULLTEXT index on MySQL
+    document = models.TextField(blank=True)
+
     def __str__(self):
         return self.name
+
+    class Meta:
+        verbose_name = "Template Search Index"
+        verbose_name_plural = "Template Search Index"
+        indexes = [
+            models.Index(
+                fields=["company", "date_created"],
+                name="search_company_created_idx",
+            ),
+            models.Index(
+                fields=["in_gallery", "date_created"],
+                name="search_gallery_created_idx",
+            ),
+        ]
+
+
+class GalleryFacet(models.Model):
+    """
+    Number of gallery templates per category or company, kept up to date
+    by apps.template.gallery so the gallery never counts on a read
+    """
+
+    kind = models.CharField(max_length=10, choices=C.GALLERY_FACETS)
+    key = models.UUIDField()
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.kind} {self.key} ({self.count})"
+
+    class Meta:
+        verbose_name = "Gallery Facet"
+        verbose_name_plural = "Gallery Facets"
+        indexes = [
+            models.Index(
+                fields=["kind", "count"], name="gallery_facet_count_idx"
+            )
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "key"], name="unique_gallery_facet"
+            )
+        ]
+
+
+class ExportJob(Base):
+    # Bulk exports have no single template, only the company
+    template = models.ForeignKey(
+        Template, on_delete=models.CASCADE, null=True, blank=True
+    )
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, null=True, blank=True
+    )
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    file_type = models.CharField(max_length=10, choices=C.EXPORT_TYPES)
+    status = models.CharField(
+        max_length=10, choices=C.JOB_STATUSES, default=C.JOB_STATUS_PENDING
+    )
+    # Percentage of the export that has been completed
+    progress = models.PositiveSmallIntegerField(default=0)
+    file_url = models.CharField(max_length=1024, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.template_id or self.company_id} ({self.file_type})"
+
+    @property
+    def file_types(self):
+        return [file.file_type for file in self.files.all()] or [
+            self.file_type
+        ]
+
+    def set_progress(self, progress, status=C.JOB_STATUS_STARTED):
+        self.progress = progress
+        self.status = status
+        self.save(update_fields=["progress", "status", "date_updated"])
+
+    def finish(self, file_url):
+        self.file_url = file_url
+        self.progress = 100
+        self.status = C.JOB_STATUS_SUCCESS
+        self.save(
+            update_fields=["file_url", "progress", "status", "date_updated"]
+        )
+
+    def fail(self, error):
+        self.error = error
+        self.status = C.JOB_STATUS_FAILURE
+        self.save(update_fields=["error", "status", "date_updated"])
+
+    class Meta:
+        verbose_name = "Export Job"
+        verbose_name_plural = "Export Jobs"
+
+
+class ExportFile(Base):
+    job = models.ForeignKey(
+        ExportJob, on_delete=models.CASCADE, related_name="files"
+    )
+    file_type = models.CharField(max_length=10, choices=C.EXPORT_TYPES)
+    file_url = models.CharField(max_length=1024, blank=True)
+
+    def __str__(self):
+        return f"{self.job_id} ({self.file_type})"
+
+    class Meta:
+        verbose_name = "Export File"
+        verbose_name_plural = "Export Files"
+
+
+class ImportJob(Base):
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    # Path of the uploaded file in the default storage
+    file = models.CharField(max_length=1024)
+    status = models.CharField(
+        max_length=10, choices=C.JOB_STATUSES, default=C.JOB_STATUS_PENDING
+    )
+    # Percentage of the upload that has been read
+    progress = models.PositiveSmallIntegerField(default=0)
+    imported = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.company_id} ({self.file})"
+
+    def set_progress(self, progress, status=C.JOB_STATUS_STARTED):
+        self.progress = progress
+        self.status = status
+        self.save(
+            update_fields=[
+                "progress",
+                "status",
+                "imported",
+                "failed",
+                "date_updated",
+            ]
+        )
+
+    def finish(self, errors):
+        self.error = "\n".join(errors)
+        self.progress = 100
+        self.status = C.JOB_STATUS_SUCCESS
+        self.save(
+            update_fields=[
+                "error",
+                "progress",
+                "status",
+                "imported",
+                "failed",
+                "date_updated",
+            ]
+        )
+
+    def fail(self, error):
+        self.error = error
+        self.status = C.JOB_STATUS_FAILURE
+        self.save(update_fields=["error", "status", "date_updated"])
+
+    class Meta:
+        verbose_name = "Import Job"
+        verbose_name_plural = "Import Jobs"
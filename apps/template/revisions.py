@@ -0,0 +1,263 @@
+"""
+Revision history of template bodies
+
+Every saved body becomes a revision. Most revisions only store the edits
+against the previous revision, html is diffed tag by tag so an autosave
+of a large template costs about the size of the change. Every
+SNAPSHOT_EVERY revisions the full body is stored, so rebuilding a
+revision never replays more than that many deltas.
+"""
+import difflib
+import json
+import re
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.template.models import (BODY_FIELDS, Template, TemplateBody,
+                                  TemplateRevision)
+
+# Splits after every ">", so diffs line up with html tags
+TOKENS = re.compile(r"(?<=>)")
+COMPACT_BATCH_SIZE = 100
+
+
+def _tokens(text):
+    return TOKENS.split(text) if text else []
+
+
+def make_delta(old, new):
+    """
+    Edits turning old into new, as [start, end] token ranges of old to
+    keep and strings to insert
+    """
+    old_tokens, new_tokens = _tokens(old), _tokens(new)
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens)
+    delta = []
+    for tag, start, end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append([start, end])
+        elif new_end > new_start:
+            delta.append("".join(new_tokens[new_start:new_end]))
+    return delta
+
+
+def apply_delta(old, delta):
+    tokens = _tokens(old)
+    parts = []
+    for edit in delta:
+        if isinstance(edit, str):
+            parts.append(edit)
+        else:
+            start, end = edit
+            parts.extend(tokens[start:end])
+    return "".join(parts)
+
+
+def _pack(payload):
+    return zlib.compress(json.dumps(payload).encode("utf-8"))
+
+
+def _unpack(data):
+    return json.loads(zlib.decompress(bytes(data)).decode("utf-8"))
+
+
+def _encode(contents, previous, snapshot):
+    """
+    The (is_snapshot, data) of a revision, deltas that do not compress
+    better than the full body are stored as a snapshot instead
+    """
+    full = _pack(contents)
+    if snapshot or previous is None:
+        return True, full
+    delta = _pack(
+        {
+            field: make_delta(previous[field], contents[field])
+            for field in BODY_FIELDS
+        }
+    )
+    if len(delta) >= len(full):
+        return True, full
+    return False, delta
+
+
+def _decode(revision, previous):
+    payload = _unpack(revision.data)
+    if revision.is_snapshot:
+        return payload
+    return {
+        field: apply_delta(previous[field], payload[field])
+        for field in BODY_FIELDS
+    }
+
+
+def get_revision_contents(template_id, number):
+    """
+    Rebuild a revision as {"content_html": ..., "content_json": ...} from
+    the closest snapshot before it, None when there is no such revision
+    """
+    revisions = TemplateRevision.objects.filter(
+        template_id=template_id, number__lte=number
+    )
+    start = (
+        revisions.filter(is_snapshot=True)
+        .order_by("-number")
+        .values_list("number", flat=True)
+        .first()
+    )
+    if start is None:
+        return None
+    contents = None
+    last = None
+    for revision in (
+        revisions.filter(number__gte=start)
+        .order_by("number")
+        .only("number", "is_snapshot", "data")
+    ):
+        contents = _decode(revision, contents)
+        last = revision.number
+    return contents if last == number else None
+
+
+def _revision_count_since_snapshot(template_id):
+    last_snapshot = (
+        TemplateRevision.objects.filter(
+            template_id=template_id, is_snapshot=True
+        )
+        .order_by("-number")
+        .values_list("number", flat=True)
+        .first()
+    )
+    return TemplateRevision.objects.filter(
+        template_id=template_id, number__gt=last_snapshot or 0
+    ).count()
+
+
+def record_revision(template, user=None):
+    """
+    Add the current body of the template to its history, saves without
+    changes to the body do not add a revision
+    """
+    with transaction.atomic():
+        # Concurrent saves of one template get consecutive numbers
+        Template.objects.select_for_update().filter(pk=template.pk).exists()
+        last = (
+            TemplateRevision.objects.filter(template_id=template.pk)
+            .order_by("-number")
+            .only("number", "body_digest")
+            .first()
+        )
+        if last is not None and last.body_digest == template.body_id:
+            return last
+        previous = None
+        if last is not None:
+            body = TemplateBody.objects.filter(digest=last.body_digest).first()
+            previous = (
+                {field: getattr(body, field) for field in BODY_FIELDS}
+                if body
+                else get_revision_contents(template.pk, last.number)
+            )
+        contents = {field: getattr(template, field) for field in BODY_FIELDS}
+        is_snapshot, data = _encode(
+            contents,
+            previous,
+            _revision_count_since_snapshot(template.pk) + 1
+            >= settings.TEMPLATE_REVISIONS["SNAPSHOT_EVERY"],
+        )
+        return TemplateRevision.objects.create(
+            template=template,
+            user=user if user and user.is_authenticated else None,
+            number=last.number + 1 if last else 1,
+            body_digest=template.body_id,
+            is_snapshot=is_snapshot,
+            data=data,
+        )
+
+
+def _iter_revisions(template_id):
+    # Read in batches, so the blobs of a long history are never all loaded
+    last = 0
+    while True:
+        batch = list(
+            TemplateRevision.objects.filter(
+                template_id=template_id, number__gt=last
+            ).order_by("number")[:COMPACT_BATCH_SIZE]
+        )
+        if not batch:
+            return
+        yield from batch
+        last = batch[-1].number
+
+
+def _iter_decoded(revisions):
+    contents = None
+    for revision in revisions:
+        contents = _decode(revision, contents)
+        yield revision, contents
+
+
+def _with_following(items):
+    previous = None
+    for item in items:
+        if previous is not None:
+            yield previous, item
+        previous = item
+    if previous is not None:
+        yield previous, None
+
+
+def _is_kept(revision, following, before, interval):
+    return (
+        revision.date_created >= before
+        or following is None
+        or following.date_created >= before
+        or int(revision.date_created.timestamp() // interval)
+        != int(following.date_created.timestamp() // interval)
+    )
+
+
+def compact_revisions(template_id, before):
+    """
+    Thin the revisions created before the given time to the last one of
+    every COMPACT_INTERVAL seconds and re-encode the remaining chain, in
+    one pass that only holds the contents of the previous revisions
+    """
+    interval = settings.TEMPLATE_REVISIONS["COMPACT_INTERVAL"]
+    snapshot_every = settings.TEMPLATE_REVISIONS["SNAPSHOT_EVERY"]
+    kept = []
+    removed = []
+    removed_count = 0
+    previous = None
+    since_snapshot = 0
+    with transaction.atomic():
+        for (revision, contents), following in _with_following(
+            _iter_decoded(_iter_revisions(template_id))
+        ):
+            following = following[0] if following else None
+            if _is_kept(revision, following, before, interval):
+                revision.is_snapshot, revision.data = _encode(
+                    contents, previous, since_snapshot + 1 >= snapshot_every
+                )
+                since_snapshot = (
+                    0 if revision.is_snapshot else since_snapshot + 1
+                )
+                revision.is_compacted = revision.date_created < before
+                previous = contents
+                kept.append(revision)
+            else:
+                removed.append(revision.pk)
+                removed_count += 1
+            # Revisions already read are written back as the pass goes on
+            if len(kept) + len(removed) >= COMPACT_BATCH_SIZE:
+                _save_compacted(kept, removed)
+                kept, removed = [], []
+        _save_compacted(kept, removed)
+    return removed_count
+
+
+def _save_compacted(kept, removed):
+    TemplateRevision.objects.filter(pk__in=removed).delete()
+    TemplateRevision.objects.bulk_update(
+        kept, ["is_snapshot", "data", "is_compacted"]
+    )
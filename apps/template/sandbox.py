@@ -0,0 +1,298 @@
+"""
+Runs template converters in separate processes with a wall clock timeout
+and a memory cap, so a pathological template only takes down its own render
+
+Each celery process keeps a few `python -m apps.template.sandbox` workers,
+started in a new session and recycled after MAX_TASKS renders. A worker and
+every browser it launches stay in its process group and are killed
+together when a render runs too long or uses too much memory. Renders are
+handed over as files in a private temporary directory.
+"""
+import json
+import os
+import queue
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class RenderError(Exception):
+    pass
+
+
+class RenderKilled(RenderError):
+    pass
+
+
+def process_group_rss(pgid):
+    """
+    Resident memory in bytes of every process in the group, None when the
+    platform has no /proc to read it from
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    total = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as file:
+                stat = file.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, fields follow the last ")"
+        fields = stat.rsplit(")", 1)[1].split()
+        if int(fields[2]) == pgid:
+            total += int(fields[21]) * PAGE_SIZE
+    return total
+
+
+def kill_process_group(pgid):
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+class SandboxWorker:
+    """
+    A long lived converter process in its own session, it reads one render
+    per line on stdin and answers with one json line on stdout
+    """
+
+    def __init__(self, command, env=None):
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self.stderr,
+            env=env,
+            start_new_session=True,
+        )
+        self.buffer = b""
+        self.tasks = 0
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def crash_reason(self):
+        self.stderr.seek(0)
+        output = self.stderr.read().decode("utf-8", "replace").strip()
+        return output.splitlines()[-1] if output else "Render crashed."
+
+    def kill(self):
+        kill_process_group(self.process.pid)
+        self.process.wait()
+
+    def run(self, task, timeout, max_memory, poll_interval=0.1):
+        """
+        Send the task and wait for its answer, the worker and every browser
+        it launched are killed when the task exceeds the timeout or the
+        memory cap
+        """
+        self.tasks += 1
+        try:
+            self.process.stdin.write(json.dumps(task).encode("utf-8") + b"\n")
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            self.kill()
+            raise RenderError(self.crash_reason())
+        started = time.monotonic()
+        stdout = self.process.stdout.fileno()
+        while b"\n" not in self.buffer:
+            ready, _, _ = select.select([stdout], [], [], poll_interval)
+            if ready:
+                chunk = os.read(stdout, 65536)
+                if not chunk:
+                    self.kill()
+                    raise RenderError(self.crash_reason())
+                self.buffer += chunk
+            elif time.monotonic() - started > timeout:
+                self.kill()
+                raise RenderKilled(
+                    f"Render timed out after {timeout} seconds."
+                )
+            else:
+                rss = process_group_rss(self.process.pid)
+                if rss is not None and rss > max_memory:
+                    self.kill()
+                    raise RenderKilled(
+                        f"Render used more than {max_memory // 2**20} MB."
+                    )
+        line, _, self.buffer = self.buffer.partition(b"\n")
+        result = json.loads(line)
+        if "error" in result:
+            raise RenderError(result["error"])
+        return result
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.stdout.close()
+        kill_process_group(self.process.pid)
+        self.process.wait()
+        self.stderr.close()
+
+
+class SandboxPool:
+    """
+    At most SIZE sandbox workers per process, idle workers are reused so
+    django is only set up once per worker, and recycled after MAX_TASKS
+    renders or when they were killed
+    """
+
+    def __init__(self, size, max_tasks, command, env=None):
+        self.max_tasks = max_tasks
+        self.command = command
+        self.env = env
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def checkout(self):
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                return SandboxWorker(self.command, self.env)
+            if worker.is_alive():
+                return worker
+            worker.close()
+
+    def checkin(self, worker):
+        if worker.is_alive() and worker.tasks < self.max_tasks:
+            self.idle.put(worker)
+        else:
+            worker.close()
+
+    def run(self, task, timeout, max_memory):
+        with self.slots:
+            worker = self.checkout()
+            try:
+                return worker.run(task, timeout, max_memory)
+            finally:
+                self.checkin(worker)
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+
+
+_pool = None
+_pool_pid = None
+
+
+def get_sandbox_pool():
+    """
+    Return the sandbox pool of the current process, forked celery workers
+    start their own workers instead of sharing the parent's pipes
+    """
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        config = settings.TEMPLATE_RENDER_SANDBOX
+        # The project root has to be importable from any working directory
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(
+                None, [str(settings.BASE_DIR.parent), env.get("PYTHONPATH")]
+            )
+        )
+        _pool = SandboxPool(
+            size=config["WORKERS"],
+            max_tasks=config["MAX_TASKS"],
+            command=[sys.executable, "-m", "apps.template.sandbox"],
+            env=env,
+        )
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def convert_in_sandbox(template, file_type, options=None):
+    """
+    Run the converter of the export type in a sandbox worker and return
+    the rendered file, killed renders are retried
+    """
+    from apps.template.utils import spooled_file
+
+    config = settings.TEMPLATE_RENDER_SANDBOX
+    # Payload, result and every scratch file of the converter live in the
+    # render directory, removed whether or not the render succeeded
+    with tempfile.TemporaryDirectory(prefix="render-") as directory:
+        task = {
+            "directory": directory,
+            "payload": os.path.join(directory, "payload.json"),
+            "result": os.path.join(directory, "result"),
+        }
+        with open(task["payload"], "w") as file:
+            json.dump(
+                {
+                    "id": str(template.id),
+                    "content_html": template.content_html,
+                    "file_type": file_type,
+                    "options": options,
+                },
+                file,
+            )
+        for attempt in range(config["RETRIES"] + 1):
+            try:
+                get_sandbox_pool().run(
+                    task, config["TIMEOUT"], config["MAX_MEMORY"]
+                )
+                break
+            except RenderKilled:
+                if attempt == config["RETRIES"]:
+                    raise
+        output = spooled_file()
+        with open(task["result"], "rb") as file:
+            shutil.copyfileobj(file, output)
+        output.seek(0)
+        return output
+
+
+def convert(task):
+    from apps.template.utils import CONVERTERS
+
+    with open(task["payload"]) as file:
+        payload = json.load(file)
+    template = SimpleNamespace(
+        id=payload["id"], content_html=payload["content_html"]
+    )
+    output = CONVERTERS[payload["file_type"]](template, payload["options"])
+    with output, open(task["result"], "wb") as file:
+        shutil.copyfileobj(output, file)
+
+
+def main():
+    # Answers go to a private copy of stdout, whatever the converters and
+    # their browsers print ends up on stderr
+    answers = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    for line in sys.stdin:
+        task = json.loads(line)
+        tempfile.tempdir = task["directory"]
+        try:
+            convert(task)
+            result = {}
+        except Exception as e:
+            result = {"error": str(e) or e.__class__.__name__}
+        finally:
+            tempfile.tempdir = None
+        answers.write(json.dumps(result) + "\n")
+        answers.flush()
+
+
+if __name__ == "__main__":
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings.development")
+    django.setup()
+    main()
@@ -1,14 +1,35 @@
+import os
+import uuid
+
 import graphene
+from django.conf import settings
+from django.core.files.storage import default_storage
 from graphene_django import DjangoObjectType
+from graphene_file_upload.scalars import Upload
 from graphql_jwt.decorators import (login_required, permission_required,
                                     staff_member_required)
+from graphql_jwt.exceptions import PermissionDenied
 
+import apps.data.constants as C
+from apps.base.pagination import (keyset_connection, page_size,
+                                  paginate_keyset, paginate_offset)
+from apps.base.selections import (join_if_selected, optimize_queryset,
+                                  selected_fields)
 from apps.company.models import Company
-from apps.company.permissions import (is_company_administrator,
+from apps.company.permissions import (accessible_company_ids,
                                       is_company_administrator_or_invited_user)
-from apps.template.models import Template, TemplateCategory
-from apps.template.utils import (convert_html_to_docx, convert_html_to_jpeg,
-                                 convert_html_to_pdf, convert_html_to_png)
+from apps.template.cache import invalidate_template_renders
+from apps.template.feed import CARD_FIELDS, get_gallery_feed_page
+from apps.template.gallery import get_gallery_facets
+from apps.template.models import (ExportFile, ExportJob, ImportJob, Template,
+                                  TemplateCategory, TemplateRevision)
+from apps.template.revisions import get_revision_contents, record_revision
+from apps.template.search import search_templates
+from apps.template.tasks import (bulk_export_templates, export_template,
+                                 import_templates,
+                                 schedule_template_thumbnails)
+from apps.template.utils import (CONVERTERS, delete_templates,
+                                 sync_template_categories)
 
 
 class TemplateCategoryType(DjangoObjectType):
@@ -18,62 +39,300 @@ class TemplateCategoryType(DjangoObjectType):
 
 
 class TemplateType(DjangoObjectType):
+    content_html = graphene.String()
+    content_json = graphene.String()
+
     class Meta:
         model = Template
+        # The history and the export jobs are only readable through their
+        # own authorized queries
+        exclude = ["revisions", "exportjob_set"]
+
+
+# Fields of the shared body, it is only joined when the query selects them
+TEMPLATE_BODY_FIELDS = ("content_html", "content_json")
+EDGE_NODE = ("edges", "node")
+
+
+class TemplateConnection(graphene.relay.Connection):
+    class Meta:
+        node = TemplateType
+
+
+class ExportFileType(DjangoObjectType):
+    class Meta:
+        model = ExportFile
+        fields = "__all__"
+
+
+class ExportJobType(DjangoObjectType):
+    class Meta:
+        model = ExportJob
         fields = "__all__"
 
 
+class ImportJobType(DjangoObjectType):
+    class Meta:
+        model = ImportJob
+        exclude = ["file"]
+
+
+class GalleryFacetType(graphene.ObjectType):
+    id = graphene.String()
+    name = graphene.String()
+    count = graphene.Int()
+
+
+class GalleryFacetsType(graphene.ObjectType):
+    categories = graphene.List(GalleryFacetType)
+    companies = graphene.List(GalleryFacetType)
+
+    @staticmethod
+    def facets(kind):
+        return [
+            GalleryFacetType(id=id, name=name, count=count)
+            for id, name, count in get_gallery_facets(kind)
+        ]
+
+    def resolve_categories(root, info):
+        return GalleryFacetsType.facets(C.GALLERY_FACET_CATEGORY)
+
+    def resolve_companies(root, info):
+        return GalleryFacetsType.facets(C.GALLERY_FACET_COMPANY)
+
+
+class TemplateSearchFilters(graphene.InputObjectType):
+    company = graphene.String()
+    categories = graphene.List(graphene.String)
+    # Search the approved public templates of every company instead
+    gallery = graphene.Boolean()
+
+
+class TemplateRevisionType(DjangoObjectType):
+    content_html = graphene.String()
+    content_json = graphene.String()
+
+    class Meta:
+        model = TemplateRevision
+        exclude = ["data"]
+
+    @staticmethod
+    def get_contents(root):
+        # Rebuilt once per revision, only when the contents are selected
+        if not hasattr(root, "_contents"):
+            root._contents = get_revision_contents(
+                root.template_id, root.number
+            )
+        return root._contents
+
+    def resolve_content_html(root, info):
+        return TemplateRevisionType.get_contents(root)["content_html"]
+
+    def resolve_content_json(root, info):
+        return TemplateRevisionType.get_contents(root)["content_json"]
+
+
 class Query(graphene.ObjectType):
     get_template_by_id = graphene.Field(TemplateType, id=graphene.String())
-    get_templates_by_administrator_id = graphene.List(TemplateType)
-    get_templates = graphene.List(TemplateType)
-    get_public_templates = graphene.List(TemplateType)
+    get_templates_by_administrator_id = graphene.relay.ConnectionField(
+        TemplateConnection
+    )
+    get_templates = graphene.relay.ConnectionField(TemplateConnection)
+    get_public_templates = graphene.relay.ConnectionField(
+        TemplateConnection,
+        categories=graphene.List(graphene.String),
+        company=graphene.String(),
+    )
+    get_gallery_facets = graphene.Field(GalleryFacetsType)
     get_template_category_id = graphene.Field(
         TemplateCategoryType, id=graphene.String(required=True)
     )
     get_template_categories = graphene.List(
         TemplateCategoryType, id=graphene.String(required=True)
     )
-    get_filter_templates = graphene.List(TemplateType)
+    get_filter_templates = graphene.List(TemplateType, name=graphene.String())
+    search_templates = graphene.relay.ConnectionField(
+        TemplateConnection,
+        query=graphene.String(required=True),
+        filters=TemplateSearchFilters(),
+    )
+    get_export_job = graphene.Field(
+        ExportJobType, id=graphene.String(required=True)
+    )
+    get_template_revisions = graphene.List(
+        TemplateRevisionType, id=graphene.String(required=True)
+    )
+    get_template_revision = graphene.Field(
+        TemplateRevisionType,
+        id=graphene.String(required=True),
+        number=graphene.Int(required=True),
+    )
+    get_import_job = graphene.Field(
+        ImportJobType, id=graphene.String(required=True)
+    )
 
     @login_required
     @permission_required("template.view_template")
     def resolve_get_template_by_id(self, info, id):
-        template = Template.objects.filter(id=id).first()
+        template = optimize_queryset(
+            join_if_selected(
+                Template.objects.filter(id=id),
+                info,
+                TEMPLATE_BODY_FIELDS,
+                "body",
+            ),
+            info,
+        ).first()
         is_company_administrator_or_invited_user(
-            info.context.user, template.company
+            info.context.user, template.company_id
         )
         return template
 
     @login_required
     @permission_required("template.view_template")
-    def resolve_get_templates_by_administrator_id(self, info):
-        template = Template.objects.filter(
-            company__administrator_id=info.context.user.id
+    def resolve_get_templates_by_administrator_id(self, info, **kwargs):
+        template = join_if_selected(
+            Template.objects.filter(
+                company_id__in=accessible_company_ids(
+                    info.context.user, C.COMPANY_ROLE_ADMINISTRATOR
+                )
+            ),
+            info,
+            TEMPLATE_BODY_FIELDS,
+            "body",
+            EDGE_NODE,
         )
-        is_company_administrator(info.context.user, template.first().company)
-        return template
+        template = optimize_queryset(template, info, EDGE_NODE)
+        return paginate_keyset(template, TemplateConnection, **kwargs)
 
     @login_required
     @permission_required("template.view_template")
-    def resolve_get_templates(self, info):
-        template = Template.objects.all().order_by("-id")
-        is_company_administrator_or_invited_user(
-            info.context.user, template.first().company
+    def resolve_get_templates(self, info, **kwargs):
+        template = join_if_selected(
+            Template.objects.filter(
+                company_id__in=accessible_company_ids(info.context.user)
+            ),
+            info,
+            TEMPLATE_BODY_FIELDS,
+            "body",
+            EDGE_NODE,
         )
-        return template
+        template = optimize_queryset(template, info, EDGE_NODE)
+        return paginate_keyset(template, TemplateConnection, **kwargs)
+
+    def resolve_get_public_templates(
+        self, info, categories=None, company=None, **kwargs
+    ):
+        # Unfiltered pages of card fields come from the cached gallery feed
+        if (
+            not categories
+            and not company
+            and kwargs.get("last") is None
+            and not kwargs.get("before")
+            and selected_fields(info, EDGE_NODE) <= set(CARD_FIELDS)
+        ):
+            after = kwargs.get("after")
+            page = get_gallery_feed_page(page_size(kwargs.get("first")), after)
+            if page is not None:
+                cards, has_next_page = page
+                return keyset_connection(
+                    [Template(**card) for card in cards],
+                    TemplateConnection,
+                    has_next_page,
+                    bool(after),
+                )
+        template = Template.objects.filter(is_approved=True, is_public=True)
+        if categories:
+            through = Template.categories.through
+            template = template.filter(
+                id__in=through.objects.filter(
+                    templatecategory_id__in=categories
+                ).values("template_id")
+            )
+        if company:
+            template = template.filter(company_id=company)
+        template = join_if_selected(
+            template,
+            info,
+            TEMPLATE_BODY_FIELDS,
+            "body",
+            EDGE_NODE,
+        )
+        template = optimize_queryset(template, info, EDGE_NODE)
+        return paginate_keyset(template, TemplateConnection, **kwargs)
 
-    def resolve_get_public_templates(self, info):
-        return Template.objects.filter(
-            is_approved=True, is_public=True
-        ).order_by("-id")
+    def resolve_get_gallery_facets(self, info):
+        return GalleryFacetsType()
+
+    @login_required
+    @permission_required("template.view_template")
+    def resolve_get_filter_templates(self, info, name=None):
+        company_ids = accessible_company_ids(info.context.user)
+        templates = optimize_queryset(
+            join_if_selected(
+                Template.objects.all(), info, TEMPLATE_BODY_FIELDS, "body"
+            ),
+            info,
+        )
+        if not name:
+            return templates.filter(company_id__in=company_ids).order_by(
+                "-date_created"
+            )
+        limit = settings.GRAPHENE_DJANGO_EXTRAS["MAX_PAGE_SIZE"]
+        template_ids = list(
+            search_templates(name, company_id__in=company_ids).values_list(
+                "template_id", flat=True
+            )[:limit]
+        )
+        templates = templates.in_bulk(template_ids)
+        return [templates[id] for id in template_ids if id in templates]
+
+    def resolve_search_templates(self, info, query, filters=None, **kwargs):
+        filters = filters or {}
+        user = info.context.user
+        if filters.get("gallery"):
+            scope = {"in_gallery": True}
+        elif user.is_authenticated and user.has_perm("template.view_template"):
+            scope = {"company_id__in": accessible_company_ids(user)}
+        else:
+            raise PermissionDenied()
+        if filters.get("company"):
+            scope["company_id"] = filters["company"]
+        if filters.get("categories"):
+            through = Template.categories.through
+            scope["template_id__in"] = through.objects.filter(
+                templatecategory_id__in=filters["categories"]
+            ).values("template_id")
+
+        def load(template_ids):
+            templates = optimize_queryset(
+                join_if_selected(
+                    Template.objects.filter(id__in=template_ids),
+                    info,
+                    TEMPLATE_BODY_FIELDS,
+                    "body",
+                    EDGE_NODE,
+                ),
+                info,
+                EDGE_NODE,
+            ).in_bulk()
+            return [templates[id] for id in template_ids if id in templates]
+
+        return paginate_offset(
+            search_templates(query, **scope).values_list(
+                "template_id", flat=True
+            ),
+            TemplateConnection,
+            load,
+            **kwargs,
+        )
 
     @login_required
     @permission_required("template.view_templatecategory")
     def resolve_get_template_category_id(self, info, id):
         category = TemplateCategory.objects.filter(id=id).first()
         is_company_administrator_or_invited_user(
-            info.context.user, category.company
+            info.context.user, category.company_id
         )
         return category
 
@@ -81,10 +340,58 @@ class Query(graphene.ObjectType):
     @permission_required("template.view_templatecategory")
     def resolve_get_template_categories(self, info, id):
         category = TemplateCategory.objects.filter(company_id=id)
+        is_company_administrator_or_invited_user(info.context.user, id)
+        return optimize_queryset(category, info)
+
+    @login_required
+    @permission_required("template.view_template")
+    def resolve_get_export_job(self, info, id):
+        job = (
+            ExportJob.objects.select_related("template", "company")
+            .filter(id=id)
+            .first()
+        )
+        if not job:
+            return None
         is_company_administrator_or_invited_user(
-            info.context.user, category.first().company
+            info.context.user, job.company_id or job.template.company_id
         )
-        return category
+        return job
+
+    @login_required
+    @permission_required("template.view_template")
+    def resolve_get_template_revisions(self, info, id):
+        template = Template.objects.filter(id=id).first()
+        is_company_administrator_or_invited_user(
+            info.context.user, template.company_id
+        )
+        return (
+            TemplateRevision.objects.filter(template_id=id)
+            .defer("data")
+            .order_by("-number")
+        )
+
+    @login_required
+    @permission_required("template.view_template")
+    def resolve_get_template_revision(self, info, id, number):
+        template = Template.objects.filter(id=id).first()
+        is_company_administrator_or_invited_user(
+            info.context.user, template.company_id
+        )
+        return (
+            TemplateRevision.objects.filter(template_id=id, number=number)
+            .defer("data")
+            .first()
+        )
+
+    @login_required
+    @permission_required("template.add_template")
+    def resolve_get_import_job(self, info, id):
+        job = ImportJob.objects.filter(id=id).first()
+        is_company_administrator_or_invited_user(
+            info.context.user, job.company_id
+        )
+        return job
 
 
 class CreateTemplate(graphene.Mutation):
@@ -104,9 +411,7 @@ class CreateTemplate(graphene.Mutation):
     @permission_required("template.add_template")
     def mutate(self, info, *args, **kwargs):
         company = kwargs.get("company")
-        is_company_administrator_or_invited_user(
-            info.context.user, Company.objects.filter(id=company).first()
-        )
+        is_company_administrator_or_invited_user(info.context.user, company)
         name = kwargs.get("name")
         summary = kwargs.get("summary")
         content_html = kwargs.get("content_html")
@@ -122,10 +427,9 @@ class CreateTemplate(graphene.Mutation):
             content_html=content_html,
             is_active=is_active,
         )
-        for category in categories:
-            category_obj = TemplateCategory.objects.filter(id=category).first()
-            if category_obj:
-                template.categories.add(category_obj)
+        sync_template_categories(template, categories)
+        record_revision(template, info.context.user)
+        schedule_template_thumbnails(template)
         return CreateTemplate(
             template=template,
             verification_message="Template created successfully.",
@@ -145,12 +449,17 @@ class CopyTemplate(graphene.Mutation):
         template_id = kwargs.get("template")
         template = Template.objects.filter(id=template_id).first()
         is_company_administrator_or_invited_user(
-            info.context.user, template.company
+            info.context.user, template.company_id
         )
-        if template:
-            clone = template
-            clone.pk = None
-            clone.save()
+        if not template:
+            return CopyTemplate(verification_message="Template not found.")
+        categories = list(template.categories.values_list("id", flat=True))
+        # The clone shares the body, copying is a metadata insert
+        clone = template
+        clone.pk = None
+        clone._state.adding = True
+        clone.save()
+        sync_template_categories(clone, categories)
         return CopyTemplate(
             template=clone,
             verification_message="Template copied successfully.",
@@ -173,7 +482,7 @@ class UpdateHTMLinTemplate(graphene.Mutation):
 
         template = Template.objects.filter(id=id).first()
         is_company_administrator_or_invited_user(
-            info.context.user, template.company
+            info.context.user, template.company_id
         )
         if template and html:
             template.content_html = html
@@ -182,6 +491,9 @@ class UpdateHTMLinTemplate(graphene.Mutation):
                     "content_html",
                 ]
             )
+            record_revision(template, info.context.user)
+            invalidate_template_renders(template.id)
+            schedule_template_thumbnails(template)
             return UpdateHTMLinTemplate(
                 template=template,
                 verification_message="Template html updated successfully.",
@@ -220,7 +532,7 @@ class UpdateTemplate(graphene.Mutation):
 
         template = Template.objects.filter(id=id).first()
         is_company_administrator_or_invited_user(
-            info.context.user, template.company
+            info.context.user, template.company_id
         )
         if template:
             template.company_id = company
@@ -238,13 +550,10 @@ class UpdateTemplate(graphene.Mutation):
                     "is_active",
                 ]
             )
-            template.categories.clear()
-            for category in categories:
-                category_obj = TemplateCategory.objects.filter(
-                    id=category
-                ).first()
-                if category_obj:
-                    template.categories.add(category_obj)
+            record_revision(template, info.context.user)
+            invalidate_template_renders(template.id)
+            schedule_template_thumbnails(template)
+            sync_template_categories(template, categories)
             return UpdateTemplate(
                 template=template,
                 verification_message="Template updated successfully.",
@@ -266,7 +575,7 @@ class DeleteTemplate(graphene.Mutation):
     def mutate(self, info, id):
         template = Template.objects.filter(id=id).first()
         is_company_administrator_or_invited_user(
-            info.context.user, template.company
+            info.context.user, template.company_id
         )
         if template:
             template.delete()
@@ -277,8 +586,14 @@ class DeleteTemplate(graphene.Mutation):
             return DeleteTemplate(verification_message="Template not found.")
 
 
+class BatchDeleteResultType(graphene.ObjectType):
+    id = graphene.String()
+    status = graphene.String()
+
+
 class BatchDeleteTemplate(graphene.Mutation):
     verification_message = graphene.String()
+    results = graphene.List(BatchDeleteResultType)
 
     class Arguments:
         objects = graphene.List(graphene.String, required=True)
@@ -287,14 +602,34 @@ class BatchDeleteTemplate(graphene.Mutation):
     @permission_required("template.delete_template")
     def mutate(self, info, **kwargs):
         objects = kwargs.get("objects", [])
+        template_ids = {}
         for id in objects:
+            try:
+                template_ids[id] = uuid.UUID(id)
+            except ValueError:
+                pass
+        # One query authorizes the whole set against the access index
+        companies = dict(
+            Template.objects.filter(id__in=template_ids.values()).values_list(
+                "id", "company_id"
+            )
+        )
+        for company_id in set(companies.values()):
             is_company_administrator_or_invited_user(
-                info.context.user,
-                Template.objects.filter(id=id).first().company,
+                info.context.user, company_id
             )
-        Template.objects.filter(id__in=objects).delete()
-        return DeleteTemplate(
-            verification_message="Templates in batch deleted."
+        delete_templates(companies, settings.TEMPLATE_BATCH_DELETE_CHUNK_SIZE)
+        return BatchDeleteTemplate(
+            verification_message="Templates in batch deleted.",
+            results=[
+                BatchDeleteResultType(
+                    id=id,
+                    status=C.DELETE_STATUS_DELETED
+                    if template_ids.get(id) in companies
+                    else C.DELETE_STATUS_NOT_FOUND,
+                )
+                for id in objects
+            ],
         )
 
 
@@ -309,7 +644,7 @@ class ActivateTemplate(graphene.Mutation):
     def mutate(self, info, id):
         template = Template.objects.filter(id=id).first()
         is_company_administrator_or_invited_user(
-            info.context.user, template.company
+            info.context.user, template.company_id
         )
         if template:
             template.is_active = not template.is_active
@@ -332,7 +667,7 @@ class MakeTemplatePublic(graphene.Mutation):
     def mutate(self, info, id):
         template = Template.objects.filter(id=id).first()
         is_company_administrator_or_invited_user(
-            info.context.user, template.company
+            info.context.user, template.company_id
         )
         if template:
             template.is_public = not template.is_public
@@ -357,7 +692,7 @@ class ApprovePublicTemplate(graphene.Mutation):
     def mutate(self, info, id):
         template = Template.objects.filter(id=id).first()
         is_company_administrator_or_invited_user(
-            info.context.user, template.company
+            info.context.user, template.company_id
         )
         if template:
             template.is_approved = not template.is_approved
@@ -384,9 +719,7 @@ class CreateTemplateCategory(graphene.Mutation):
     def mutate(self, info, **kwargs):
         name = kwargs.get("name")
         company = kwargs.get("company")
-        is_company_administrator_or_invited_user(
-            info.context.user, Company.objects.filter(id=company).first()
-        )
+        is_company_administrator_or_invited_user(info.context.user, company)
         template_category = TemplateCategory.objects.create(
             company_id=company, name=name
         )
@@ -458,37 +791,134 @@ class DeleteTemplateCategory(graphene.Mutation):
 
 
 class ExportTemplate(graphene.Mutation):
+    job = graphene.Field(ExportJobType)
+    job_id = graphene.String()
     verification_message = graphene.String()
     file_url = graphene.String()
 
     class Arguments:
         id = graphene.String(required=True)
-        type = graphene.String(required=True)
+        type = graphene.String()
+        types = graphene.List(graphene.String)
 
     @login_required
     @permission_required("template.view_template")
-    def mutate(self, info, id):
+    def mutate(self, info, id, type=None, types=None):
         template = Template.objects.filter(id=id).first()
+        if not template:
+            return ExportTemplate(verification_message="Template not found.")
         is_company_administrator_or_invited_user(
-            info.context.user, template.company
+            info.context.user, template.company_id
         )
-        if template:
-            if type == "pdf":
-                file = convert_html_to_pdf(template.content_html)
-            elif type == "png":
-                file = convert_html_to_png(template.content_html)
-            elif type == "docx":
-                file = convert_html_to_docx(template.content_html)
-            elif type == "jpeg":
-                file = convert_html_to_jpeg(template.content_html)
-            else:
-                file = None
+        # Several types are rendered together in a single job
+        file_types = list(dict.fromkeys(types or [type]))
+        if not all(file_type in CONVERTERS for file_type in file_types):
             return ExportTemplate(
-                verification_message="Template exported successfully.",
-                file=file,
+                verification_message="Export type not supported."
             )
-        else:
-            return ExportTemplate(verification_message="Template not found.")
+        job = ExportJob.objects.create(
+            template=template,
+            company_id=template.company_id,
+            user=info.context.user,
+            file_type=file_types[0],
+        )
+        ExportFile.objects.bulk_create(
+            [
+                ExportFile(job=job, file_type=file_type)
+                for file_type in file_types
+            ]
+        )
+        export_template.apply_async(
+            (str(job.id),), priority=settings.TEMPLATE_EXPORT_PRIORITY
+        )
+        return ExportTemplate(
+            job=job,
+            job_id=job.id,
+            verification_message="Template export started.",
+        )
+
+
+class BulkExportTemplates(graphene.Mutation):
+    job = graphene.Field(ExportJobType)
+    job_id = graphene.String()
+    verification_message = graphene.String()
+
+    class Arguments:
+        ids = graphene.List(graphene.String, required=True)
+        formats = graphene.List(graphene.String, required=True)
+
+    @login_required
+    @permission_required("template.view_template")
+    def mutate(self, info, ids, formats):
+        file_types = list(dict.fromkeys(formats))
+        if not file_types or not all(
+            file_type in CONVERTERS for file_type in file_types
+        ):
+            return BulkExportTemplates(
+                verification_message="Export type not supported."
+            )
+        template_ids = []
+        for id in ids:
+            try:
+                template_ids.append(uuid.UUID(id))
+            except ValueError:
+                return BulkExportTemplates(
+                    verification_message=f"Template {id} not found."
+                )
+        company_ids = set(
+            Template.objects.filter(id__in=template_ids).values_list(
+                "company_id", flat=True
+            )
+        )
+        if len(company_ids) != 1:
+            return BulkExportTemplates(
+                verification_message=(
+                    "Templates in a bulk export must belong to one company."
+                )
+            )
+        company = Company.objects.filter(id=company_ids.pop()).first()
+        is_company_administrator_or_invited_user(info.context.user, company)
+        job = ExportJob.objects.create(
+            company=company,
+            user=info.context.user,
+            file_type=file_types[0],
+        )
+        bulk_export_templates.apply_async(
+            (str(job.id), [str(id) for id in template_ids], file_types),
+            priority=settings.TEMPLATE_EXPORT_PRIORITY,
+        )
+        return BulkExportTemplates(
+            job=job,
+            job_id=job.id,
+            verification_message="Bulk template export started.",
+        )
+
+
+class ImportTemplates(graphene.Mutation):
+    job = graphene.Field(ImportJobType)
+    job_id = graphene.String()
+    verification_message = graphene.String()
+
+    class Arguments:
+        company = graphene.String(required=True)
+        file = Upload(required=True)
+
+    @login_required
+    @permission_required("template.add_template")
+    def mutate(self, info, company, file):
+        is_company_administrator_or_invited_user(info.context.user, company)
+        job = ImportJob(company_id=company, user=info.context.user)
+        # The upload is streamed to storage, the worker reads it from there
+        job.file = default_storage.save(
+            f"imports/{job.id}/{os.path.basename(file.name)}", file
+        )
+        job.save()
+        import_templates.delay(str(job.id))
+        return ImportTemplates(
+            job=job,
+            job_id=job.id,
+            verification_message="Template import started.",
+        )
 
 
 class Mutation(graphene.ObjectType):
@@ -498,6 +928,8 @@ class Mutation(graphene.ObjectType):
     delete_template = DeleteTemplate.Field()
     copy_template = CopyTemplate.Field()
     export_template = ExportTemplate.Field()
+    bulk_export_templates = BulkExportTemplates.Field()
+    import_templates = ImportTemplates.Field()
     batch_delete_template = BatchDeleteTemplate.Field()
     activate_template = ActivateTemplate.Field()
     make_template_public = MakeTemplatePublic.Field()
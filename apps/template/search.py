@@ -0,0 +1,160 @@
+"""
+Full-text search over templates
+
+Every template has a TemplateSearchIndex row with its name, summary,
+category names and the text of its html. On MySQL the rows are searched
+through a FULLTEXT index and ranked by relevance; other databases fall
+back to substring matching, ranked by the terms found in the name.
+"""
+import re
+from html import unescape
+from html.parser import HTMLParser
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+
+from apps.template.gallery import gallery_facet_keys, refresh_gallery_facets
+from apps.template.models import Template, TemplateSearchIndex
+
+TERMS = re.compile(r"\w+")
+# Terms shorter than innodb_ft_min_token_size are not in the FULLTEXT index
+MIN_FULLTEXT_TERM_LENGTH = 3
+INDEX_BATCH_SIZE = 500
+
+
+class _TextExtractor(HTMLParser):
+    SKIPPED_TAGS = {"script", "style", "head", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self.skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self.skipping:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if not self.skipping and data.strip():
+            self.parts.append(data.strip())
+
+
+def html_to_text(html):
+    """
+    The visible text of the html, without tags, scripts and styles
+    """
+    extractor = _TextExtractor()
+    extractor.feed(html or "")
+    extractor.close()
+    return unescape(" ".join(extractor.parts))
+
+
+def build_document(template, category_names):
+    document = "\n".join(
+        [
+            template.name,
+            template.summary or "",
+            " ".join(category_names),
+            html_to_text(template.content_html),
+        ]
+    )
+    max_length = settings.TEMPLATE_SEARCH_MAX_DOCUMENT_LENGTH
+    return document[:max_length]
+
+
+def index_templates(template_ids):
+    """
+    Rebuild the search index rows of the templates, a batch at a time
+    """
+    template_ids = iter(template_ids)
+    while True:
+        batch = list(islice(template_ids, INDEX_BATCH_SIZE))
+        if not batch:
+            return
+        templates = (
+            Template.objects.filter(id__in=batch)
+            .select_related("body")
+            .prefetch_related("categories")
+        )
+        rows = []
+        for template in templates:
+            categories = list(template.categories.all())
+            rows.append(
+                TemplateSearchIndex(
+                    template_id=template.id,
+                    company_id=template.company_id,
+                    name=template.name,
+                    in_gallery=template.is_public and template.is_approved,
+                    date_created=template.date_created,
+                    category_ids=[str(category.id) for category in categories],
+                    document=build_document(
+                        template, [category.name for category in categories]
+                    ),
+                )
+            )
+        indexed = TemplateSearchIndex.objects.filter(template_id__in=batch)
+        with transaction.atomic():
+            # Gallery counts change for what the templates leave and enter
+            category_ids, company_ids = gallery_facet_keys(
+                [
+                    *indexed.values_list(
+                        "in_gallery", "company_id", "category_ids"
+                    ),
+                    *(
+                        (row.in_gallery, row.company_id, row.category_ids)
+                        for row in rows
+                    ),
+                ]
+            )
+            indexed.delete()
+            TemplateSearchIndex.objects.bulk_create(rows)
+            refresh_gallery_facets(category_ids, company_ids)
+
+
+def _fulltext_query(terms):
+    # Every term is required and matches as a prefix, "+invoice* +blue*"
+    return " ".join(f"+{term}*" for term in terms)
+
+
+def search_templates(query, **filters):
+    """
+    Index rows matching every term of the query, best matches first
+    """
+    terms = list(dict.fromkeys(TERMS.findall(query.lower())))
+    index = TemplateSearchIndex.objects.filter(**filters)
+    if not terms:
+        return index.none()
+    if connection.vendor == "mysql":
+        indexed = [t for t in terms if len(t) >= MIN_FULLTEXT_TERM_LENGTH]
+        if indexed:
+            rank = RawSQL(
+                f"MATCH ({TemplateSearchIndex._meta.db_table}.document) "
+                "AGAINST (%s IN BOOLEAN MODE)",
+                [_fulltext_query(indexed)],
+            )
+            index = index.annotate(rank=rank).filter(rank__gt=0)
+            for term in terms:
+                if term not in indexed:
+                    index = index.filter(document__icontains=term)
+            return index.order_by("-rank", "-date_created")
+    for term in terms:
+        index = index.filter(document__icontains=term)
+    rank = sum(
+        (
+            Case(
+                When(name__icontains=term, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            for term in terms
+        ),
+        Value(0),
+    )
+    return index.annotate(rank=rank).order_by("-rank", "-date_created")
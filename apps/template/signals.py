@@ -0,0 +1,119 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from app.views import invalidate_cached_responses
+from apps.company.models import Company
+from apps.template.feed import remove_gallery_card, update_gallery_card
+from apps.template.gallery import gallery_facet_keys, refresh_gallery_facets
+from apps.template.models import (Template, TemplateCategory,
+                                  TemplateSearchIndex)
+from apps.template.search import index_templates
+from apps.template.tasks import schedule_gallery_feed
+
+# Template fields that end up in the search index
+INDEXED_FIELDS = {
+    "name",
+    "summary",
+    "body",
+    "company",
+    "is_public",
+    "is_approved",
+}
+
+
+def in_gallery(template):
+    return template.is_public and template.is_approved
+
+
+@receiver(post_save, sender=Template)
+def template_saved(sender, instance, update_fields=None, **kwargs):
+    # In the gallery now, or leaving it as the index row still tells
+    touches_gallery = in_gallery(instance) or (
+        TemplateSearchIndex.objects.filter(
+            pk=instance.pk, in_gallery=True
+        ).exists()
+    )
+    # Saves of e.g. only the thumbnails leave the index as it is
+    if update_fields is None or INDEXED_FIELDS & set(update_fields):
+        index_templates([instance.pk])
+    if update_gallery_card(instance):
+        schedule_gallery_feed()
+    # Edits of private templates leave the cached public responses alone
+    if touches_gallery:
+        invalidate_cached_responses("template")
+
+
+@receiver(pre_delete, sender=Template)
+def remember_gallery_facets(sender, instance, **kwargs):
+    # Batch deletes update the gallery once per chunk, see delete_templates
+    if getattr(instance, "_deleted_in_batch", False):
+        return
+    instance._gallery_facets = gallery_facet_keys(
+        TemplateSearchIndex.objects.filter(
+            template_id=instance.pk
+        ).values_list("in_gallery", "company_id", "category_ids")
+    )
+
+
+@receiver(post_delete, sender=Template)
+def template_deleted(sender, instance, **kwargs):
+    if getattr(instance, "_deleted_in_batch", False):
+        return
+    category_ids, company_ids = getattr(instance, "_gallery_facets", ((), ()))
+    refresh_gallery_facets(category_ids, company_ids)
+    if remove_gallery_card(instance.pk):
+        schedule_gallery_feed()
+    # Only gallery templates are counted for a company
+    if company_ids:
+        invalidate_cached_responses("template")
+
+
+@receiver(m2m_changed, sender=Template.categories.through)
+def template_categories_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            index_templates([instance.pk])
+            if in_gallery(instance):
+                invalidate_cached_responses("template")
+    elif action == "pre_clear":
+        # The templates of a cleared category are only known before
+        instance._cleared_template_ids = list(
+            instance.template_set.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        index_templates(getattr(instance, "_cleared_template_ids", []))
+        invalidate_cached_responses("template")
+    elif action in ("post_add", "post_remove"):
+        index_templates(pk_set)
+        invalidate_cached_responses("template")
+
+
+@receiver(post_save, sender=TemplateCategory)
+def category_saved(sender, instance, created, **kwargs):
+    if not created:
+        index_templates(
+            instance.template_set.values_list("pk", flat=True).iterator()
+        )
+
+
+@receiver(pre_delete, sender=TemplateCategory)
+def remember_category_templates(sender, instance, **kwargs):
+    # The category is removed from its templates without m2m signals
+    instance._template_ids = list(
+        instance.template_set.values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=TemplateCategory)
+def category_deleted(sender, instance, **kwargs):
+    index_templates(getattr(instance, "_template_ids", []))
+
+
+@receiver(post_save, sender=TemplateCategory)
+@receiver(post_delete, sender=TemplateCategory)
+@receiver(post_save, sender=Company)
+def invalidate_template_responses(sender, **kwargs):
+    invalidate_cached_responses("template")
@@ -0,0 +1,358 @@
+import os
+import shutil
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+import apps.data.constants as C
+from app.celery import app
+from app.views import invalidate_cached_responses
+from apps.storages.utils import get_selected_storage, upload_to_storage
+from apps.template.cache import render_key
+from apps.template.feed import FEED_KEY, build_gallery_feed
+from apps.template.imports import iter_import_records, parse_template_record
+from apps.template.models import (ExportJob, ImportJob, Template, TemplateBody,
+                                  TemplateCategory, TemplateRevision)
+from apps.template.revisions import compact_revisions
+from apps.template.search import INDEX_BATCH_SIZE, index_templates
+from apps.template.utils import (make_thumbnails, render_template,
+                                 render_template_formats, spooled_file)
+
+
+@app.task(name="export_template", acks_late=True)
+def export_template(job_id):
+    """
+    A celery task to render a template export and upload the results
+    """
+    job = (
+        ExportJob.objects.select_related("template").filter(id=job_id).first()
+    )
+    if not job:
+        return "Export job not found."
+    job.set_progress(10)
+    files = {file.file_type: file for file in job.files.all()}
+    file_types = list(files) or [job.file_type]
+    outputs = {}
+    try:
+        outputs = render_template_formats(job.template, file_types)
+        job.set_progress(60)
+        storage = get_selected_storage(job.template.company_id)
+        file_urls = {}
+        for index, (file_type, output) in enumerate(outputs.items(), 1):
+            file_urls[file_type] = upload_to_storage(
+                storage,
+                output,
+                f"exports/template-{job.template_id}-{job.id}.{file_type}",
+            )
+            job.set_progress(60 + 40 * index // (len(outputs) + 1))
+    except Exception as e:
+        job.fail(str(e))
+        return f"Export failed: {e}"
+    finally:
+        for output in outputs.values():
+            output.close()
+    for file_type, file in files.items():
+        file.file_url = file_urls[file_type]
+        file.save(update_fields=["file_url"])
+    job.finish(file_urls[file_types[0]])
+    return file_urls
+
+
+def _render_in_parallel(templates, file_types, workers):
+    """
+    Yield (template, files or exception) while keeping at most twice the
+    worker count of renders in flight, so memory stays bounded
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for template in templates:
+            future = pool.submit(render_template_formats, template, file_types)
+            pending[future] = template
+            if len(pending) < workers * 2:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                template = pending.pop(future)
+                yield template, future.exception() or future.result()
+        for future, template in pending.items():
+            yield template, future.exception() or future.result()
+
+
+@app.task(name="bulk_export_templates", acks_late=True)
+def bulk_export_templates(job_id, template_ids, file_types):
+    """
+    A celery task to render many templates into a zip archive that is
+    written entry by entry and uploaded to the company storage
+    """
+    job = ExportJob.objects.filter(id=job_id).first()
+    if not job:
+        return "Export job not found."
+    job.set_progress(1)
+    templates = Template.objects.filter(
+        id__in=template_ids, company_id=job.company_id
+    ).select_related("body")
+    total = templates.count()
+    errors = []
+    archive = spooled_file()
+    try:
+        with zipfile.ZipFile(
+            archive, "w", compression=zipfile.ZIP_DEFLATED
+        ) as zip_file:
+            renders = _render_in_parallel(
+                templates.iterator(chunk_size=100),
+                file_types,
+                settings.TEMPLATE_BULK_EXPORT_WORKERS,
+            )
+            for done, (template, outputs) in enumerate(renders, start=1):
+                if isinstance(outputs, Exception):
+                    errors.append(f"{template.id}: {outputs}")
+                    continue
+                name = f"{slugify(template.name) or 'template'}-{template.id}"
+                for file_type, output in outputs.items():
+                    with output, zip_file.open(
+                        f"{name}.{file_type}", "w"
+                    ) as entry:
+                        shutil.copyfileobj(output, entry)
+                job.set_progress(max(1, 90 * done // total))
+            if errors:
+                zip_file.writestr("errors.txt", "\n".join(errors))
+        storage = get_selected_storage(job.company_id)
+        file_url = upload_to_storage(
+            storage, archive, f"exports/templates-{job.id}.zip"
+        )
+    except Exception as e:
+        job.fail(str(e))
+        return f"Export failed: {e}"
+    finally:
+        archive.close()
+    if errors:
+        job.error = "\n".join(errors)
+        job.save(update_fields=["error"])
+    job.finish(file_url)
+    return file_url
+
+
+def _thumbnail_key(template_id):
+    return f"thumbnail:{template_id}"
+
+
+def schedule_template_thumbnails(template):
+    """
+    Queue thumbnail generation for the template, edits within the debounce
+    window replace the pending generation instead of adding another one
+    """
+    if not template.content_html:
+        return
+    config = settings.TEMPLATE_THUMBNAILS
+    digest = render_key(template.content_html, "thumbnail", config)
+    cache.set(_thumbnail_key(template.id), digest, None)
+    generate_template_thumbnails.apply_async(
+        (str(template.id), digest), countdown=config["DEBOUNCE"]
+    )
+
+
+@app.task(name="generate_template_thumbnails", acks_late=True)
+def generate_template_thumbnails(template_id, digest):
+    """
+    A celery task to screenshot a template and store its thumbnails
+    """
+    if cache.get(_thumbnail_key(template_id)) != digest:
+        return "Superseded by a newer edit."
+    template = Template.objects.filter(id=template_id).first()
+    if not template:
+        return "Template not found."
+    config = settings.TEMPLATE_THUMBNAILS
+    thumbnails = []
+    with render_template(
+        template, C.EXPORT_TYPE_PNG, {"size": config["SIZE"]}
+    ) as screenshot:
+        thumbnails = make_thumbnails(
+            screenshot, config["WIDTHS"], config["FORMATS"]
+        )
+    storage = get_selected_storage(template.company_id)
+    urls = {}
+    for file_format, width, output in thumbnails:
+        name = f"{digest[:12]}-{width}.{file_format}"
+        with output:
+            urls.setdefault(file_format, {})[str(width)] = upload_to_storage(
+                storage, output, f"thumbnails/{template.id}/{name}"
+            )
+    key = _thumbnail_key(template_id)
+    # The template may have been edited again while rendering
+    if cache.get(key) != digest:
+        return "Superseded by a newer edit."
+    primary_format, primary_width = config["PRIMARY"]
+    template.thumbnails = urls
+    template.screenshot = urls[primary_format][str(primary_width)]
+    template.save(update_fields=["thumbnails", "screenshot"])
+    # Only clear the key when no newer edit has replaced the digest
+    if cache.get(key) == digest:
+        cache.delete(key)
+    return urls
+
+
+def _insert_templates(batch):
+    """
+    Insert a batch of (template, category ids) with one statement for the
+    templates and one for their categories, bulk inserts send no signals
+    so the batch is indexed here
+    """
+    through = Template.categories.through
+    with transaction.atomic():
+        TemplateBody.attach([template for template, _ in batch])
+        Template.objects.bulk_create([template for template, _ in batch])
+        through.objects.bulk_create(
+            [
+                through(template_id=template.id, templatecategory_id=id)
+                for template, category_ids in batch
+                for id in category_ids
+            ]
+        )
+        index_templates([template.id for template, _ in batch])
+
+
+@app.task(name="import_templates", acks_late=True)
+def import_templates(job_id):
+    """
+    A celery task to read an uploaded template library as a stream and
+    insert its templates in batches
+    """
+    job = ImportJob.objects.filter(id=job_id).first()
+    if not job:
+        return "Import job not found."
+    job.set_progress(1)
+    categories = {}
+    for id, name in TemplateCategory.objects.filter(
+        company_id=job.company_id
+    ).values_list("id", "name"):
+        categories[str(id)] = id
+        categories.setdefault(name, id)
+    batch_size = settings.TEMPLATE_IMPORT_BATCH_SIZE
+    errors = []
+    batch = []
+    try:
+        size = max(default_storage.size(job.file), 1)
+        with default_storage.open(job.file, "rb") as file:
+            records = iter_import_records(file, os.path.basename(job.file))
+            for location, raw in records:
+                try:
+                    batch.append(
+                        parse_template_record(raw, job.company_id, categories)
+                    )
+                except ValueError as e:
+                    job.failed += 1
+                    if len(errors) < settings.TEMPLATE_IMPORT_MAX_ERRORS:
+                        errors.append(f"{location}: {e}")
+                    continue
+                if len(batch) < batch_size:
+                    continue
+                _insert_templates(batch)
+                job.imported += len(batch)
+                batch = []
+                # The read position covers zip members and ndjson alike
+                job.set_progress(max(1, min(99, 100 * file.tell() // size)))
+            _insert_templates(batch)
+            job.imported += len(batch)
+    except Exception as e:
+        job.fail(str(e))
+        return f"Import failed: {e}"
+    finally:
+        default_storage.delete(job.file)
+    job.finish(errors)
+    return job.imported
+
+
+@app.task(name="delete_unused_template_bodies", acks_late=True)
+def delete_unused_template_bodies():
+    """
+    A periodic celery task to drop bodies no template points at anymore,
+    edits leave the previous body behind for other templates sharing it
+    """
+    config = settings.TEMPLATE_BODY_CLEANUP
+    batch_size = config["BATCH_SIZE"]
+    unused = TemplateBody.objects.filter(
+        templates=None,
+        date_created__lt=timezone.now()
+        - timedelta(seconds=config["GRACE_PERIOD"]),
+    )
+    deleted = 0
+    last = ""
+    while True:
+        digests = list(
+            unused.filter(digest__gt=last)
+            .order_by("digest")
+            .values_list("digest", flat=True)[:batch_size]
+        )
+        if not digests:
+            return deleted
+        last = digests[-1]
+        # The delete checks the conditions again, bodies attached in the
+        # meantime are kept
+        deleted += unused.filter(digest__in=digests)._raw_delete(unused.db)
+
+
+@app.task(name="compact_template_revisions", acks_late=True)
+def compact_template_revisions():
+    """
+    A periodic celery task to thin out the revision history that is older
+    than the KEEP_DAYS setting
+    """
+    before = timezone.now() - timedelta(
+        days=settings.TEMPLATE_REVISIONS["KEEP_DAYS"]
+    )
+    template_ids = (
+        TemplateRevision.objects.filter(
+            date_created__lt=before, is_compacted=False
+        )
+        .values_list("template_id", flat=True)
+        .distinct()
+    )
+    removed = 0
+    for template_id in template_ids:
+        removed += compact_revisions(template_id, before)
+    return removed
+
+
+@app.task(name="rebuild_template_search_index", acks_late=True)
+def rebuild_template_search_index():
+    """
+    A celery task to index every template, e.g. after the index was added
+    """
+    template_ids = Template.objects.order_by("pk").values_list("id", flat=True)
+    indexed = 0
+    batch = list(template_ids[:INDEX_BATCH_SIZE])
+    while batch:
+        index_templates(batch)
+        indexed += len(batch)
+        batch = list(template_ids.filter(pk__gt=batch[-1])[:INDEX_BATCH_SIZE])
+    return indexed
+
+
+def schedule_gallery_feed():
+    """
+    Rebuild the gallery feed once the transaction commits, changes within
+    the debounce window share one rebuild
+    """
+    debounce = settings.TEMPLATE_GALLERY_FEED["DEBOUNCE"]
+    if cache.add(f"{FEED_KEY}:scheduled", True, debounce):
+        transaction.on_commit(
+            lambda: rebuild_gallery_feed.apply_async(countdown=debounce)
+        )
+
+
+@app.task(name="rebuild_gallery_feed", acks_late=True)
+def rebuild_gallery_feed():
+    """
+    A celery task to rebuild the cached feed of the public gallery
+    """
+    cache.delete(f"{FEED_KEY}:scheduled")
+    count = build_gallery_feed()
+    invalidate_cached_responses("template")
+    return count
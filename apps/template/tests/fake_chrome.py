@@ -0,0 +1,59 @@
+"""
+A stand-in chrome for the screenshot tests, it answers the DevTools
+commands of a screenshot on fds 3 and 4 and its png is its pid and the
+html of the page
+"""
+import base64
+import json
+import os
+import sys
+from urllib.parse import urlparse
+
+
+def answer(answers, message):
+    answers.write(json.dumps(message).encode("utf-8") + b"\0")
+    answers.flush()
+
+
+def main():
+    if "--version" in sys.argv:
+        print("Chromium 1.0")
+        return
+    answers = os.fdopen(4, "wb")
+    html = ""
+    buffer = b""
+    while True:
+        chunk = os.read(3, 65536)
+        if not chunk:
+            return
+        buffer += chunk
+        while b"\0" in buffer:
+            line, _, buffer = buffer.partition(b"\0")
+            message = json.loads(line)
+            method, params = message["method"], message["params"]
+            result = {}
+            if method == "Target.createTarget":
+                result = {"targetId": "page"}
+            elif method == "Target.attachToTarget":
+                result = {"sessionId": "session"}
+            elif method == "Page.navigate":
+                with open(urlparse(params["url"]).path) as file:
+                    html = file.read()
+                if html == "crash":
+                    os._exit(1)
+                # The load event may arrive before the answer
+                answer(
+                    answers,
+                    {
+                        "method": "Page.loadEventFired",
+                        "sessionId": message["sessionId"],
+                    },
+                )
+            elif method == "Page.captureScreenshot":
+                png = f"{os.getpid()}:{html}".encode("utf-8")
+                result = {"data": base64.b64encode(png).decode("ascii")}
+            answer(answers, {"id": message["id"], "result": result})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,62 @@
+import glob
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
 import pytest
+from django.conf import settings
+from django.contrib.admin import site
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.forms.models import model_to_dict
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql_jwt.middleware import JSONWebTokenMiddleware
 from graphql_jwt.testcases import JSONWebTokenTestCase
+from PIL import Image
 
+import apps.data.constants as C
+from apps.base.fields import CompressedText
+from apps.base.loaders import DataLoaderMiddleware, RelationLoader
 from apps.company.tests.factories import CompanyFactory
+from apps.template.admin import TemplateAdminForm, TemplateBodyAdmin
+from apps.template.browsers import BrowserError, HeadlessBrowser, close_browser
+from apps.template.cache import DiskRenderCache, invalidate_template_renders
+from apps.template.feed import FEED_KEY
+from apps.template.models import (ExportFile, ExportJob, GalleryFacet,
+                                  ImportJob, Template, TemplateBody,
+                                  TemplateRevision, TemplateSearchIndex)
+from apps.template.revisions import get_revision_contents, record_revision
+from apps.template.sandbox import (RenderKilled, SandboxPool, SandboxWorker,
+                                   get_sandbox_pool)
+from apps.template.tasks import (bulk_export_templates,
+                                 compact_template_revisions,
+                                 delete_unused_template_bodies,
+                                 export_template, generate_template_thumbnails,
+                                 import_templates, rebuild_gallery_feed,
+                                 rebuild_template_search_index,
+                                 schedule_template_thumbnails)
 from apps.template.tests.factories import (TemplateCategoryFactory,
                                            TemplateFactory)
+from apps.template.utils import (convert_html_to_png, convert_template,
+                                 delete_templates, render_template,
+                                 render_template_formats,
+                                 sync_template_categories)
 from apps.users.tests.factories import UserFactory
 
 
@@ -60,13 +112,19 @@ class TemplateTestCase(JSONWebTokenTestCase):
         query = """
             query {
                 getTemplatesByAdministratorId{
-                    name
+                    edges {
+                        node {
+                            name
+                        }
+                    }
                 }
             }
             """
         response = self.client.execute(query)
         assert (
-            response.data["getTemplatesByAdministratorId"][0]["name"]
+            response.data["getTemplatesByAdministratorId"]["edges"][0]["node"][
+                "name"
+            ]
             == self.template.name
         )
 
@@ -74,23 +132,243 @@ class TemplateTestCase(JSONWebTokenTestCase):
         query = """
             query{
                 getTemplates{
-                    name
+                    edges {
+                        node {
+                            name
+                        }
+                    }
                 }
             }
             """
         response = self.client.execute(query)
-        assert response.data["getTemplates"][0]["name"] == self.template.name
+        edges = response.data["getTemplates"]["edges"]
+        assert edges[0]["node"]["name"] == self.template.name
+
+    def test_get_templates_pagination(self):
+        for _ in range(4):
+            TemplateFactory(company=self.company)
+        query = """
+            query getTemplates($first: Int, $after: String){
+                getTemplates(first: $first, after: $after){
+                    edges {
+                        node {
+                            id
+                        }
+                    }
+                    pageInfo {
+                        endCursor
+                        hasNextPage
+                    }
+                }
+            }
+            """
+        ids = []
+        variables = {"first": 2}
+        while True:
+            response = self.client.execute(query, variables)
+            connection = response.data["getTemplates"]
+            ids += [edge["node"]["id"] for edge in connection["edges"]]
+            if not connection["pageInfo"]["hasNextPage"]:
+                break
+            variables["after"] = connection["pageInfo"]["endCursor"]
+        assert len(ids) == 5
+        assert len(set(ids)) == 5
+
+    def test_get_templates_defers_body(self):
+        query = """
+            query{
+                getTemplates{
+                    edges {
+                        node {
+                            ...Card
+                        }
+                    }
+                }
+            }
+            fragment Card on TemplateType { name %s }
+            """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.execute(query % "")
+        assert response.errors is None
+        assert "content_html" not in " ".join(q["sql"] for q in queries)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.execute(query % "contentHtml")
+        assert response.errors is None
+        assert "content_html" in " ".join(q["sql"] for q in queries)
+
+    def test_get_templates_batches_relations(self):
+        query = """
+            query{
+                getTemplates{
+                    edges {
+                        node {
+                            company {
+                                name
+                                invitedUsers {
+                                    email
+                                }
+                            }
+                            categories {
+                                name
+                            }
+                        }
+                    }
+                }
+            }
+            """
+        self.client.middleware([JSONWebTokenMiddleware, DataLoaderMiddleware])
+        self.company.invited_users.add(UserFactory())
+        # Warm the company access index of the user
+        self.client.execute(query)
+        counts = []
+        for _ in range(2):
+            for _ in range(3):
+                template = TemplateFactory(company=self.company)
+                template.categories.add(self.template_category)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.execute(query)
+            assert response.errors is None
+            counts.append(len(queries))
+        assert counts[0] == counts[1]
+        edges = response.data["getTemplates"]["edges"]
+        assert len(edges) == 6
+        assert edges[0]["node"]["company"]["name"] == self.company.name
+
+    def test_nested_template_contents_load_bodies_at_once(self):
+        query = """
+            query getCompanyById($id: String!){
+                getCompanyById(id: $id){
+                    templateSet {
+                        contentHtml
+                    }
+                }
+            }
+            """
+        for number in range(5):
+            template = TemplateFactory(company=self.company)
+            template.content_html = f"<p>{number}</p>"
+            template.save()
+        variables = {"id": str(self.company.id)}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.execute(query, variables)
+        assert response.errors is None
+        templates = response.data["getCompanyById"]["templateSet"]
+        assert len(templates) == 6
+        bodies = [q for q in queries if "template_templatebody" in q["sql"]]
+        assert len(bodies) == 1
+        # Lists the query plan doesn't cover are batched by the loader
+        loader = RelationLoader()
+        templates = list(Template.objects.filter(company=self.company))
+        loader.add(templates)
+        loader.load(templates[0], "content_html")
+        with self.assertNumQueries(0):
+            contents = {template.content_html for template in templates}
+        assert "<p>4</p>" in contents
+
+    def test_get_templates_joins_selected_relations(self):
+        query = """
+            query{
+                getTemplates{
+                    edges {
+                        node {
+                            company {
+                                name
+                            }
+                            categories {
+                                name
+                            }
+                        }
+                    }
+                }
+            }
+            """
+        self.template.categories.add(self.template_category)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.execute(query)
+        assert response.errors is None
+        node = response.data["getTemplates"]["edges"][0]["node"]
+        assert node["categories"] == [{"name": self.template_category.name}]
+        sqls = [q["sql"] for q in queries]
+        assert any(
+            "JOIN" in sql and "company_company" in sql
+            for sql in sqls
+            if "template_template" in sql
+        )
+        categories = [sql for sql in sqls if "templatecategory" in sql]
+        assert categories
+        assert not any("date_expired" in sql for sql in categories)
+
+    def test_admin_form_edits_contents_without_touching_shared_body(self):
+        self.template.content_html = "<p>Shared</p>"
+        self.template.save()
+        copy = TemplateFactory(company=self.company)
+        copy.body = self.template.body
+        copy.save()
+        data = model_to_dict(self.template, exclude=["categories"])
+        data.update(
+            thumbnails="{}", content_html="<p>Edited</p>", content_json=""
+        )
+        form = TemplateAdminForm(data, instance=self.template)
+        assert form.is_valid(), form.errors
+        form.save()
+        copy.refresh_from_db()
+        self.template.refresh_from_db()
+        assert self.template.content_html == "<p>Edited</p>"
+        assert copy.content_html == "<p>Shared</p>"
+        assert not TemplateBodyAdmin(TemplateBody, site).has_change_permission(
+            None
+        )
+
+    def test_revisions_are_not_template_fields(self):
+        query = """
+            query{
+                getPublicTemplates{
+                    edges {
+                        node {
+                            revisions {
+                                number
+                            }
+                        }
+                    }
+                }
+            }
+            """
+        response = self.client.execute(query)
+        assert response.errors
+        assert "revisions" in response.errors[0].message
+
+    def test_export_jobs_are_not_template_fields(self):
+        query = """
+            query{
+                getPublicTemplates{
+                    edges {
+                        node {
+                            exportjobSet {
+                                fileUrl
+                            }
+                        }
+                    }
+                }
+            }
+            """
+        response = self.client.execute(query)
+        assert response.errors
+        assert "exportjobSet" in response.errors[0].message
 
     def test_get_public_templates(self):
         query = """
             query{
                 getPublicTemplates{
-                    name
+                    edges {
+                        node {
+                            name
+                        }
+                    }
                 }
             }
             """
         response = self.client.execute(query)
-        assert response.data["getPublicTemplates"] == []
+        assert response.data["getPublicTemplates"]["edges"] == []
 
     def test_get_template_category_id(self):
         query = """
@@ -120,7 +398,10 @@ class TemplateTestCase(JSONWebTokenTestCase):
             == self.template_category.name
         )
 
-    def test_create_template(self):
+    @mock.patch(
+        "apps.template.tasks.generate_template_thumbnails.apply_async",
+    )
+    def test_create_template(self, generate_thumbnails):
         query = """
             mutation createTemplate(
                 $company: String!,
@@ -166,8 +447,12 @@ class TemplateTestCase(JSONWebTokenTestCase):
             ]
             == self.template_category.name
         )
+        generate_thumbnails.assert_called_once()
 
-    def test_update_template(self):
+    @mock.patch(
+        "apps.template.tasks.generate_template_thumbnails.apply_async",
+    )
+    def test_update_template(self, generate_thumbnails):
         query = """
             mutation updateTemplate(
                 $id: String!,
@@ -216,6 +501,517 @@ class TemplateTestCase(JSONWebTokenTestCase):
             ]
             == self.template_category.name
         )
+        generate_thumbnails.assert_called_once()
+
+    def test_copy_template(self):
+        query = """
+            mutation copyTemplate($template: String!) {
+                copyTemplate(template: $template) {
+                    template {
+                        id
+                        contentHtml
+                        categories {
+                            name
+                        }
+                    }
+                }
+            }
+            """
+        self.template.content_html = "<p>Shared</p>"
+        self.template.save(update_fields=["content_html"])
+        self.template.categories.add(self.template_category)
+        variables = {"template": str(self.template.id)}
+        response = self.client.execute(query, variables)
+        copy = response.data["copyTemplate"]["template"]
+        assert copy["contentHtml"] == "<p>Shared</p>"
+        assert copy["categories"] == [{"name": self.template_category.name}]
+        clone = Template.objects.get(id=copy["id"])
+        assert clone.body_id == self.template.body_id
+        assert (
+            TemplateBody.objects.filter(content_html="<p>Shared</p>").count()
+            == 1
+        )
+        self.template.content_html = "<p>Edited</p>"
+        self.template.save(update_fields=["content_html"])
+        delete_unused_template_bodies()
+        assert clone.body.content_html == "<p>Shared</p>"
+        clone.delete()
+        shared = TemplateBody.objects.filter(content_html="<p>Shared</p>")
+        # Unused bodies are kept for the grace period
+        assert delete_unused_template_bodies() == 0
+        shared.update(date_created=timezone.now() - timedelta(days=2))
+        # Attaching an unused body again renews it
+        self.template.content_html = "<p>Shared</p>"
+        self.template.save(update_fields=["content_html"])
+        assert delete_unused_template_bodies() == 0
+        self.template.content_html = "<p>Edited again</p>"
+        self.template.save(update_fields=["content_html"])
+        TemplateBody.objects.exclude(digest=self.template.body_id).update(
+            date_created=timezone.now() - timedelta(days=2)
+        )
+        with override_settings(
+            TEMPLATE_BODY_CLEANUP={"BATCH_SIZE": 1, "GRACE_PERIOD": 60}
+        ):
+            unused = TemplateBody.objects.count() - 1
+            assert delete_unused_template_bodies() == unused
+        assert not shared.exists()
+        assert list(TemplateBody.objects.all()) == [self.template.body]
+
+    @override_settings(
+        TEMPLATE_REVISIONS={
+            "SNAPSHOT_EVERY": 3,
+            "KEEP_DAYS": 7,
+            "COMPACT_INTERVAL": 60 * 60,
+        }
+    )
+    @mock.patch(
+        "apps.template.tasks.generate_template_thumbnails.apply_async",
+    )
+    def test_template_revisions(self, generate_thumbnails):
+        mutation = """
+            mutation updateHtmlInTemplate($id: String!, $html: String!) {
+                updateHtmlInTemplate(id: $id, html: $html) {
+                    verificationMessage
+                }
+            }
+            """
+        rows = "".join(f"<tr><td>Row {i}</td></tr>" for i in range(200))
+        versions = [
+            f"<table>{rows.replace('Row 7<', f'Row {v}<')}</table>"
+            for v in range(5)
+        ]
+        for html in versions + versions[-1:]:
+            self.client.execute(
+                mutation, {"id": str(self.template.id), "html": html}
+            )
+        query = """
+            query getTemplateRevisions($id: String!, $number: Int!) {
+                getTemplateRevisions(id: $id) {
+                    number
+                    isSnapshot
+                }
+                getTemplateRevision(id: $id, number: $number) {
+                    contentHtml
+                }
+            }
+            """
+        response = self.client.execute(
+            query, {"id": str(self.template.id), "number": 2}
+        )
+        revisions = response.data["getTemplateRevisions"]
+        # The repeated save is not a revision, every third is a snapshot
+        assert [revision["number"] for revision in revisions] == [
+            5,
+            4,
+            3,
+            2,
+            1,
+        ]
+        assert [revision["isSnapshot"] for revision in revisions] == [
+            False,
+            True,
+            False,
+            False,
+            True,
+        ]
+        assert (
+            response.data["getTemplateRevision"]["contentHtml"] == versions[1]
+        )
+        delta = self.template.revisions.get(number=2).data
+        assert len(delta) < len(zlib.compress(versions[1].encode())) / 2
+        for number, html in enumerate(versions, start=1):
+            contents = get_revision_contents(self.template.id, number)
+            assert contents["content_html"] == html
+
+    # Small batches, so the history is read and written back in pieces
+    @mock.patch("apps.template.revisions.COMPACT_BATCH_SIZE", 2)
+    def test_compact_template_revisions(self):
+        for number in range(1, 7):
+            self.template.content_html = f"<p>Version {number}</p>"
+            self.template.save(update_fields=["content_html"])
+            record_revision(self.template)
+        hour = (timezone.now() - timedelta(days=9)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        # Two old hours with three and two revisions and a recent one
+        for number, date_created in zip(
+            range(1, 7),
+            [
+                hour + timedelta(minutes=10),
+                hour + timedelta(minutes=20),
+                hour + timedelta(minutes=30),
+                hour + timedelta(hours=1, minutes=10),
+                hour + timedelta(hours=1, minutes=20),
+                timezone.now() - timedelta(days=1),
+            ],
+        ):
+            self.template.revisions.filter(number=number).update(
+                date_created=date_created
+            )
+        assert compact_template_revisions() == 3
+        assert list(
+            self.template.revisions.order_by("number").values_list(
+                "number", flat=True
+            )
+        ) == [3, 5, 6]
+        for number in [3, 5, 6]:
+            contents = get_revision_contents(self.template.id, number)
+            assert contents["content_html"] == f"<p>Version {number}</p>"
+        assert get_revision_contents(self.template.id, 4) is None
+        assert compact_template_revisions() == 0
+
+    def test_template_body_is_compressed(self):
+        content_json = json.dumps({"rows": [{"type": "text"}] * 500})
+        self.template.content_json = content_json
+        self.template.save(update_fields=["content_json"])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT content_json FROM template_templatebody "
+                "WHERE digest = %s",
+                [self.template.body_id],
+            )
+            stored = bytes(cursor.fetchone()[0])
+        assert len(stored) < len(content_json) / 10
+        body = TemplateBody.objects.get(digest=self.template.body_id)
+        assert isinstance(body.__dict__["content_json"], CompressedText)
+        assert body.content_json == content_json
+        assert TemplateBody.objects.filter(content_json=content_json).exists()
+
+    def test_get_filter_templates_joins_bodies(self):
+        for number in range(5):
+            template = TemplateFactory(company=self.company, name="Alpha")
+            template.content_html = f"<p>{number}</p>"
+            template.save()
+        query = """
+            query getFilterTemplates($name: String){
+                getFilterTemplates(name: $name){
+                    contentHtml
+                }
+            }
+            """
+        for name in ("alpha", None):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.execute(query, {"name": name})
+            assert response.errors is None
+            assert len(response.data["getFilterTemplates"]) >= 5
+            bodies = [q for q in queries if "templatebody" in q["sql"]]
+            assert len(bodies) == 1
+
+    def test_search_templates(self):
+        invoice = TemplateFactory(company=self.company, name="Blue invoice")
+        invoice.content_html = (
+            "<style>.hidden{}</style><h1>Monthly &amp; yearly</h1>"
+        )
+        invoice.save(update_fields=["content_html"])
+        receipt = TemplateFactory(company=self.company, name="Receipt")
+        receipt.content_html = "<p>Blue invoice footer</p>"
+        receipt.save(update_fields=["content_html"])
+        sync_template_categories(receipt, [self.template_category.id])
+        TemplateFactory(company=CompanyFactory(), name="Blue invoice")
+        query = """
+            query searchTemplates(
+                $query: String!, $filters: TemplateSearchFilters,
+                $first: Int, $after: String) {
+                searchTemplates(
+                    query: $query, filters: $filters,
+                    first: $first, after: $after) {
+                    edges {
+                        node {
+                            name
+                        }
+                    }
+                    pageInfo {
+                        endCursor
+                        hasNextPage
+                    }
+                }
+            }
+            """
+        response = self.client.execute(
+            query, {"query": "invoice BLUE", "first": 1}
+        )
+        connection = response.data["searchTemplates"]
+        # Name matches rank first, other companies are not searched
+        assert connection["edges"] == [{"node": {"name": "Blue invoice"}}]
+        assert connection["pageInfo"]["hasNextPage"]
+        response = self.client.execute(
+            query,
+            {
+                "query": "invoice BLUE",
+                "after": connection["pageInfo"]["endCursor"],
+            },
+        )
+        connection = response.data["searchTemplates"]
+        assert connection["edges"] == [{"node": {"name": "Receipt"}}]
+        assert not connection["pageInfo"]["hasNextPage"]
+        for text, names in [
+            ("monthly yearly", ["Blue invoice"]),
+            ("hidden", []),
+            (self.template_category.name, ["Receipt"]),
+        ]:
+            response = self.client.execute(query, {"query": text})
+            edges = response.data["searchTemplates"]["edges"]
+            assert [edge["node"]["name"] for edge in edges] == names
+        response = self.client.execute(
+            query,
+            {
+                "query": "blue",
+                "filters": {"categories": [str(self.template_category.id)]},
+            },
+        )
+        edges = response.data["searchTemplates"]["edges"]
+        assert edges == [{"node": {"name": "Receipt"}}]
+        self.client.logout()
+        response = self.client.execute(query, {"query": "blue"})
+        assert response.errors
+        receipt.is_public = True
+        receipt.is_approved = True
+        receipt.save(update_fields=["is_public", "is_approved"])
+        response = self.client.execute(
+            query, {"query": "blue", "filters": {"gallery": True}}
+        )
+        edges = response.data["searchTemplates"]["edges"]
+        assert edges == [{"node": {"name": "Receipt"}}]
+        # A rebuild restores the index a page of templates at a time
+        TemplateSearchIndex.objects.all().delete()
+        with mock.patch("apps.template.tasks.INDEX_BATCH_SIZE", 2):
+            assert rebuild_template_search_index() == Template.objects.count()
+        response = self.client.execute(
+            query, {"query": "blue", "filters": {"gallery": True}}
+        )
+        edges = response.data["searchTemplates"]["edges"]
+        assert edges == [{"node": {"name": "Receipt"}}]
+
+    def test_gallery_facets(self):
+        other = TemplateCategoryFactory(company=self.company)
+        templates = [TemplateFactory(company=self.company) for _ in range(3)]
+        for template in templates:
+            template.is_public = True
+            template.is_approved = True
+            template.save(update_fields=["is_public", "is_approved"])
+        sync_template_categories(templates[0], [self.template_category.id])
+        sync_template_categories(
+            templates[1], [self.template_category.id, other.id]
+        )
+        # Public but not approved templates are not in the gallery
+        self.template.is_public = True
+        self.template.save(update_fields=["is_public"])
+        self.template.categories.add(other)
+        query = """
+            query getGallery($categories: [String]) {
+                getGalleryFacets {
+                    categories {
+                        id
+                        count
+                    }
+                    companies {
+                        name
+                        count
+                    }
+                }
+                getPublicTemplates(categories: $categories) {
+                    edges {
+                        node {
+                            id
+                        }
+                    }
+                }
+            }
+            """
+        variables = {"categories": [str(other.id)]}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.execute(query, variables)
+        assert not any(
+            "GROUP BY" in q["sql"] or "COUNT(" in q["sql"] for q in queries
+        )
+        facets = response.data["getGalleryFacets"]
+        assert facets["categories"] == [
+            {"id": str(self.template_category.id), "count": 2},
+            {"id": str(other.id), "count": 1},
+        ]
+        assert facets["companies"] == [{"name": self.company.name, "count": 3}]
+        edges = response.data["getPublicTemplates"]["edges"]
+        assert edges == [{"node": {"id": str(templates[1].id)}}]
+        templates[1].is_approved = False
+        templates[1].save(update_fields=["is_approved"])
+        templates[0].delete()
+        response = self.client.execute(query, variables)
+        facets = response.data["getGalleryFacets"]
+        assert facets["categories"] == []
+        assert facets["companies"] == [{"name": self.company.name, "count": 1}]
+
+    @override_settings(TEMPLATE_GALLERY_FEED={"CHUNK_SIZE": 2, "DEBOUNCE": 5})
+    def test_gallery_feed(self):
+        self.addCleanup(cache.delete, FEED_KEY)
+        templates = [TemplateFactory(company=self.company) for _ in range(3)]
+        for template in templates:
+            template.is_public = True
+            template.is_approved = True
+            template.save(update_fields=["is_public", "is_approved"])
+        assert rebuild_gallery_feed() == 3
+        query = """
+            query getGallery($after: String) {
+                getPublicTemplates(first: 2, after: $after) {
+                    edges {
+                        node {
+                            id
+                            name
+                        }
+                    }
+                    pageInfo {
+                        hasNextPage
+                        endCursor
+                    }
+                }
+            }
+            """
+        newest = sorted(
+            Template.objects.filter(id__in=[t.id for t in templates]),
+            key=lambda template: (template.date_created, str(template.id)),
+            reverse=True,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.execute(query)
+            page = response.data["getPublicTemplates"]
+            after = page["pageInfo"]["endCursor"]
+            next_page = self.client.execute(query, {"after": after})
+        assert not any("template_template" in q["sql"] for q in queries)
+        assert page["pageInfo"]["hasNextPage"]
+        next_page = next_page.data["getPublicTemplates"]
+        assert not next_page["pageInfo"]["hasNextPage"]
+        ids = [
+            edge["node"]["id"] for edge in page["edges"] + next_page["edges"]
+        ]
+        assert ids == [str(template.id) for template in newest]
+        # A template leaving the gallery drops its card, the page falls
+        # back to the database until the feed is rebuilt
+        newest[0].is_approved = False
+        newest[0].save(update_fields=["is_approved"])
+        response = self.client.execute(query)
+        ids = [
+            edge["node"]["id"]
+            for edge in response.data["getPublicTemplates"]["edges"]
+        ]
+        assert ids == [str(template.id) for template in newest[1:]]
+
+    def test_public_responses_follow_gallery_changes(self):
+        gallery = TemplateFactory(company=self.company)
+        gallery.is_public = True
+        gallery.is_approved = True
+        gallery.save()
+        client = Client()
+        query = """
+            query getGallery($categories: [String]) {
+                getPublicTemplates(categories: $categories) {
+                    edges {
+                        node {
+                            id
+                        }
+                    }
+                }
+            }
+            """
+        variables = {"categories": [str(self.template_category.id)]}
+
+        def execute():
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(
+                    "/graphql",
+                    {"query": query, "variables": variables},
+                    content_type="application/json",
+                )
+            edges = response.json()["data"]["getPublicTemplates"]["edges"]
+            hit = not any("template_template" in q["sql"] for q in queries)
+            return [edge["node"]["id"] for edge in edges], hit
+
+        assert execute() == ([], False)
+        assert execute() == ([], True)
+        # Private autosaves keep the cached gallery
+        with self.captureOnCommitCallbacks(execute=True):
+            self.template.content_html = "<p>Draft</p>"
+            self.template.save()
+            sync_template_categories(
+                self.template, [self.template_category.id]
+            )
+        assert execute() == ([], True)
+        with self.captureOnCommitCallbacks(execute=True):
+            sync_template_categories(gallery, [self.template_category.id])
+        assert execute() == ([str(gallery.id)], False)
+        with self.captureOnCommitCallbacks(execute=True):
+            gallery.is_approved = False
+            gallery.save(update_fields=["is_approved"])
+        assert execute() == ([], False)
+
+    def test_resolver_queries_use_indexes(self):
+        # SQLite compares booleans as bare columns, which its planner can't
+        # look up in an index, MySQL compares them to 1 and 0
+        boolean_lookups = connection.vendor != "sqlite"
+        revisions = TemplateRevision.objects.filter(template=self.template)
+        queries = [
+            (
+                Template.objects.filter(
+                    company_id__in=[self.company.id]
+                ).order_by("-date_created", "-id"),
+                "template_company_created_idx",
+                False,
+            ),
+            (
+                Template.objects.filter(
+                    is_approved=True, is_public=True
+                ).order_by("-date_created", "-id"),
+                "template_gallery_idx",
+                True,
+            ),
+            (
+                revisions.filter(is_snapshot=True, number__lte=5).order_by(
+                    "-number"
+                ),
+                "revision_snapshot_idx",
+                True,
+            ),
+            (
+                TemplateRevision.objects.filter(
+                    date_created__lt=timezone.now(), is_compacted=False
+                ),
+                "revision_compaction_idx",
+                True,
+            ),
+            (
+                TemplateSearchIndex.objects.filter(
+                    company_id__in=[self.company.id]
+                ),
+                "search_company_created_idx",
+                False,
+            ),
+            (
+                TemplateSearchIndex.objects.filter(in_gallery=True),
+                "search_gallery_created_idx",
+                True,
+            ),
+            (
+                GalleryFacet.objects.filter(
+                    kind=C.GALLERY_FACET_CATEGORY
+                ).order_by("-count"),
+                "gallery_facet_count_idx",
+                False,
+            ),
+        ]
+        for queryset, index, filters_booleans in queries:
+            if filters_booleans and not boolean_lookups:
+                continue
+            plan = queryset.explain()
+            assert index in plan, plan
+
+    def test_sync_template_categories(self):
+        kept = TemplateCategoryFactory(company=self.company)
+        added = TemplateCategoryFactory(company=self.company)
+        self.template.categories.add(self.template_category, kept)
+        sync_template_categories(
+            self.template, [str(kept.id), str(added.id), "missing"]
+        )
+        assert set(self.template.categories.all()) == {kept, added}
+        sync_template_categories(self.template, [])
+        assert not self.template.categories.exists()
 
     def test_delete_template(self):
         query = """
@@ -340,16 +1136,505 @@ class TemplateTestCase(JSONWebTokenTestCase):
             mutation batchDeleteTemplate($objects: [String!]!) {
                 batchDeleteTemplate(objects: $objects) {
                     verificationMessage
+                    results {
+                        id
+                        status
+                    }
                 }
             }
             """
+        self.template.categories.add(self.template_category)
+        other = TemplateFactory(company=self.company)
         variables = {
-            "objects": [
-                str(self.template.id),
-            ]
+            "objects": [str(self.template.id), str(other.id), "missing"]
         }
-        response = self.client.execute(query, variables)
+        with self.settings(TEMPLATE_BATCH_DELETE_CHUNK_SIZE=1):
+            response = self.client.execute(query, variables)
         assert (
             response.data["batchDeleteTemplate"]["verificationMessage"]
             == "Templates in batch deleted."
         )
+        assert [
+            result["status"]
+            for result in response.data["batchDeleteTemplate"]["results"]
+        ] == [
+            C.DELETE_STATUS_DELETED,
+            C.DELETE_STATUS_DELETED,
+            C.DELETE_STATUS_NOT_FOUND,
+        ]
+        assert not Template.objects.filter(
+            id__in=[self.template.id, other.id]
+        ).exists()
+
+    def test_batch_delete_updates_gallery_per_chunk(self):
+        def create(count, gallery):
+            ids = []
+            for _ in range(count):
+                template = TemplateFactory(
+                    company=self.company,
+                    is_public=gallery,
+                    is_approved=gallery,
+                )
+                template.categories.add(self.template_category)
+                ids.append(template.id)
+            return ids
+
+        def count_queries(template_ids):
+            with CaptureQueriesContext(connection) as queries:
+                delete_templates(template_ids, 100)
+            return len(queries)
+
+        kept = create(1, True)
+        for gallery in (False, True):
+            assert count_queries(create(2, gallery)) == count_queries(
+                create(20, gallery)
+            )
+        assert set(
+            GalleryFacet.objects.values_list("kind", "key", "count")
+        ) == {
+            (C.GALLERY_FACET_CATEGORY, self.template_category.id, 1),
+            (C.GALLERY_FACET_COMPANY, self.company.id, 1),
+        }
+        assert set(
+            Template.objects.filter(company=self.company).values_list(
+                "id", flat=True
+            )
+        ) == {self.template.id, *kept}
+        delete_templates(kept, 100)
+        assert not GalleryFacet.objects.exists()
+        assert not TemplateSearchIndex.objects.filter(
+            template_id__in=kept
+        ).exists()
+
+    def test_batch_delete_template_denied(self):
+        query = """
+            mutation batchDeleteTemplate($objects: [String!]!) {
+                batchDeleteTemplate(objects: $objects) {
+                    verificationMessage
+                }
+            }
+            """
+        other = TemplateFactory()
+        variables = {"objects": [str(self.template.id), str(other.id)]}
+        response = self.client.execute(query, variables)
+        assert response.errors
+        assert Template.objects.filter(id=self.template.id).exists()
+
+    @mock.patch("apps.template.schemas.schema.export_template.apply_async")
+    def test_export_template(self, apply_async):
+        query = """
+            mutation exportTemplate($id: String!, $type: String!) {
+                exportTemplate(id: $id, type: $type) {
+                    jobId
+                    job {
+                        status
+                    }
+                }
+            }
+            """
+        variables = {"id": str(self.template.id), "type": "pdf"}
+        response = self.client.execute(query, variables)
+        job_id = response.data["exportTemplate"]["jobId"]
+        assert response.data["exportTemplate"]["job"]["status"] == "PENDING"
+        apply_async.assert_called_once_with((job_id,), priority=mock.ANY)
+
+        variables = {"id": str(uuid.uuid4()), "type": "pdf"}
+        response = self.client.execute(query, variables)
+        assert not response.errors
+        assert response.data["exportTemplate"]["jobId"] is None
+        apply_async.assert_called_once()
+
+    def test_get_export_job(self):
+        job = ExportJob.objects.create(
+            template=self.template,
+            file_type=C.EXPORT_TYPE_PDF,
+            status=C.JOB_STATUS_SUCCESS,
+            progress=100,
+            file_url="https://example.com/template.pdf",
+        )
+        query = """
+            query getExportJob($id: String!){
+                getExportJob(id: $id){
+                    progress
+                    fileUrl
+                }
+            }
+            """
+        variables = {"id": str(job.id)}
+        response = self.client.execute(query, variables)
+        assert response.data["getExportJob"]["progress"] == 100
+        assert response.data["getExportJob"]["fileUrl"] == job.file_url
+
+        response = self.client.execute(query, {"id": str(uuid.uuid4())})
+        assert not response.errors
+        assert response.data["getExportJob"] is None
+
+    @mock.patch("apps.template.tasks.upload_to_storage")
+    @mock.patch("apps.template.tasks.render_template_formats")
+    def test_export_template_task(self, render_formats, upload_to_storage):
+        render_formats.return_value = {C.EXPORT_TYPE_PDF: io.BytesIO(b"%PDF")}
+        upload_to_storage.return_value = "https://example.com/template.pdf"
+        job = ExportJob.objects.create(
+            template=self.template, file_type=C.EXPORT_TYPE_PDF
+        )
+        export_template(str(job.id))
+        job.refresh_from_db()
+        assert job.status == C.JOB_STATUS_SUCCESS
+        assert job.file_url == "https://example.com/template.pdf"
+
+    def isolated_render_cache(self):
+        # Renders of earlier tests or runs must not be cache hits
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, True)
+        return self.settings(
+            TEMPLATE_RENDER_CACHE={
+                **settings.TEMPLATE_RENDER_CACHE,
+                "BACKEND": "disk",
+                "LOCATION": location,
+            }
+        )
+
+    @mock.patch("apps.template.utils.convert_template")
+    def test_render_template_cache(self, convert_template):
+        convert_template.side_effect = lambda *args: io.BytesIO(b"%PDF")
+        with self.isolated_render_cache():
+            render_template(self.template, C.EXPORT_TYPE_PDF)
+            with render_template(self.template, C.EXPORT_TYPE_PDF) as output:
+                assert output.read() == b"%PDF"
+            assert convert_template.call_count == 1
+            invalidate_template_renders(self.template.id)
+            render_template(self.template, C.EXPORT_TYPE_PDF)
+        assert convert_template.call_count == 2
+
+    def test_disk_render_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, True)
+        config = {
+            "LOCATION": location,
+            "MAX_SIZE": 10,
+            "MAX_ENTRY_SIZE": 10,
+            "EVICT_AFTER": 8,
+        }
+        render_cache = DiskRenderCache(config)
+        key = "ab" * 32
+        # Writers of one key each write their own temporary file
+        with ThreadPoolExecutor(8) as executor:
+            assert all(
+                executor.map(
+                    lambda _: render_cache.set(key, b"1234"), range(32)
+                )
+            )
+        assert render_cache.get(key) == b"1234"
+        assert os.listdir(os.path.dirname(render_cache.path(key))) == [key]
+        render_cache.delete(key)
+        render_cache.delete(key)
+        assert render_cache.get(key) is None
+
+        render_cache = DiskRenderCache(config)
+        keys = [f"{number:064d}" for number in range(4)]
+        for number, key in enumerate(keys[:3]):
+            render_cache.set(key, b"1234")
+            os.utime(render_cache.path(key), (number, number))
+        # Nothing is evicted until EVICT_AFTER bytes were written
+        assert all(render_cache.get(key) for key in keys[:3])
+        for number, key in enumerate(keys[:3]):
+            os.utime(render_cache.path(key), (number, number))
+        render_cache.set(keys[3], b"1234")
+        assert [render_cache.get(key) for key in keys] == [
+            None,
+            None,
+            b"1234",
+            b"1234",
+        ]
+
+    def fake_chrome(self):
+        # An executable running tests/fake_chrome.py
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        path = os.path.join(directory, "chrome")
+        script = os.path.join(os.path.dirname(__file__), "fake_chrome.py")
+        with open(script) as source, open(path, "w") as file:
+            file.write(f"#!{sys.executable}\n{source.read()}")
+        os.chmod(path, 0o755)
+        return path
+
+    def test_screenshots_reuse_the_browser(self):
+        chrome = self.fake_chrome()
+        self.addCleanup(close_browser)
+        close_browser()
+
+        def screenshot(content_html):
+            template = SimpleNamespace(
+                id=uuid.uuid4(), content_html=content_html
+            )
+            with convert_html_to_png(template) as output:
+                pid, _, html = output.read().decode().partition(":")
+            return pid, html
+
+        with mock.patch(
+            "apps.template.browsers.HeadlessBrowser",
+            side_effect=lambda: HeadlessBrowser(chrome),
+        ), self.settings(
+            TEMPLATE_RENDER_SANDBOX={
+                **settings.TEMPLATE_RENDER_SANDBOX,
+                "MAX_TASKS": 2,
+            }
+        ):
+            first = screenshot("<p>1</p>")
+            assert first[1] == "<p>1</p>"
+            assert screenshot("<p>2</p>") == (first[0], "<p>2</p>")
+            # Recycled after MAX_TASKS screenshots
+            second = screenshot("<p>3</p>")
+            assert second[0] != first[0]
+            # A crashed browser is replaced on the next screenshot
+            with self.assertRaises(BrowserError):
+                screenshot("crash")
+            third = screenshot("<p>4</p>")
+            assert third[0] not in (first[0], second[0])
+        # The html of every screenshot is removed right after
+        assert not glob.glob(
+            os.path.join(tempfile.gettempdir(), "screenshot-*")
+        )
+
+    @mock.patch("apps.template.tasks.upload_to_storage")
+    @mock.patch("apps.template.tasks.render_template_formats")
+    def test_export_template_task_formats(self, render_formats, upload):
+        render_formats.return_value = {
+            C.EXPORT_TYPE_PDF: io.BytesIO(b"%PDF"),
+            C.EXPORT_TYPE_PNG: io.BytesIO(b"PNG"),
+        }
+        upload.side_effect = lambda storage, file, name: f"/{name}"
+        job = ExportJob.objects.create(
+            template=self.template, file_type=C.EXPORT_TYPE_PDF
+        )
+        for file_type in (C.EXPORT_TYPE_PDF, C.EXPORT_TYPE_PNG):
+            ExportFile.objects.create(job=job, file_type=file_type)
+        export_template(str(job.id))
+        # Every job has its own files, a later export never overwrites them
+        name = f"template-{self.template.id}-{job.id}"
+        assert dict(job.files.values_list("file_type", "file_url")) == {
+            C.EXPORT_TYPE_PDF: f"/exports/{name}.pdf",
+            C.EXPORT_TYPE_PNG: f"/exports/{name}.png",
+        }
+
+    @override_settings(TEMPLATE_RENDER_SANDBOX={"ENABLED": False})
+    def test_render_template_formats_derives_jpeg(self):
+        def screenshot(template, options):
+            output = io.BytesIO()
+            Image.new("RGBA", (4, 4)).save(output, "PNG")
+            output.seek(0)
+            return output
+
+        convert_html_to_png = mock.Mock(side_effect=screenshot)
+        with self.isolated_render_cache(), mock.patch.dict(
+            "apps.template.utils.CONVERTERS",
+            {C.EXPORT_TYPE_PNG: convert_html_to_png},
+        ):
+            outputs = render_template_formats(
+                self.template, [C.EXPORT_TYPE_PNG, C.EXPORT_TYPE_JPEG]
+            )
+        assert convert_html_to_png.call_count == 1
+        with Image.open(outputs[C.EXPORT_TYPE_JPEG]) as image:
+            assert image.format == "JPEG"
+
+    @mock.patch(
+        "apps.template.schemas.schema.bulk_export_templates.apply_async"
+    )
+    def test_bulk_export_templates(self, apply_async):
+        query = """
+            mutation bulkExportTemplates(
+                $ids: [String]!, $formats: [String]!) {
+                bulkExportTemplates(ids: $ids, formats: $formats) {
+                    jobId
+                }
+            }
+            """
+        variables = {"ids": [str(self.template.id)], "formats": ["pdf"]}
+        response = self.client.execute(query, variables)
+        job_id = response.data["bulkExportTemplates"]["jobId"]
+        assert ExportJob.objects.get(id=job_id).company == self.company
+        apply_async.assert_called_once_with(
+            (job_id, [str(self.template.id)], ["pdf"]), priority=mock.ANY
+        )
+
+        variables["ids"].append("not-a-uuid")
+        response = self.client.execute(query, variables)
+        assert not response.errors
+        assert response.data["bulkExportTemplates"]["jobId"] is None
+        apply_async.assert_called_once()
+
+    @mock.patch("apps.template.tasks.upload_to_storage")
+    @mock.patch("apps.template.tasks.render_template_formats")
+    def test_bulk_export_templates_task(self, render_formats, upload):
+        def render(template, file_types):
+            return {C.EXPORT_TYPE_PDF: io.BytesIO(b"%PDF")}
+
+        def read_archive(storage, file, name):
+            file.seek(0)
+            with zipfile.ZipFile(file) as archive:
+                self.archived = archive.namelist()
+            return f"/{name}"
+
+        render_formats.side_effect = render
+        upload.side_effect = read_archive
+        other = TemplateFactory(company=self.company)
+        job = ExportJob.objects.create(
+            company=self.company, file_type=C.EXPORT_TYPE_PDF
+        )
+        bulk_export_templates(
+            str(job.id),
+            [str(self.template.id), str(other.id)],
+            [C.EXPORT_TYPE_PDF],
+        )
+        job.refresh_from_db()
+        assert job.status == C.JOB_STATUS_SUCCESS
+        assert len(self.archived) == 2
+
+    @mock.patch("apps.template.tasks.upload_to_storage")
+    @mock.patch("apps.template.tasks.render_template")
+    @mock.patch("apps.template.tasks.generate_template_thumbnails.apply_async")
+    def test_generate_template_thumbnails(self, apply_async, render, upload):
+        def screenshot(template, file_type, options):
+            output = io.BytesIO()
+            Image.new("RGB", (1280, 960)).save(output, "PNG")
+            output.seek(0)
+            return output
+
+        render.side_effect = screenshot
+        upload.side_effect = lambda storage, file, name: f"/{name}"
+        self.template.content_html = "<p>first</p>"
+        schedule_template_thumbnails(self.template)
+        stale_digest = apply_async.call_args[0][0][1]
+        self.template.content_html = "<p>second</p>"
+        self.template.save(update_fields=["content_html"])
+        schedule_template_thumbnails(self.template)
+        digest = apply_async.call_args[0][0][1]
+
+        generate_template_thumbnails(str(self.template.id), stale_digest)
+        assert render.call_count == 0
+        generate_template_thumbnails(str(self.template.id), digest)
+        self.template.refresh_from_db()
+        assert self.template.screenshot.endswith("-640.jpeg")
+        assert set(self.template.thumbnails) == {"webp", "jpeg"}
+        assert cache.get(f"thumbnail:{self.template.id}") is None
+
+        # An edit while rendering keeps the newer digest pending
+        def edit_while_rendering(template, file_type, options):
+            self.template.content_html = "<p>third</p>"
+            schedule_template_thumbnails(self.template)
+            return screenshot(template, file_type, options)
+
+        render.side_effect = edit_while_rendering
+        cache.set(f"thumbnail:{self.template.id}", digest, None)
+        screenshot_url = self.template.screenshot
+        assert (
+            generate_template_thumbnails(str(self.template.id), digest)
+            == "Superseded by a newer edit."
+        )
+        newest = apply_async.call_args[0][0][1]
+        assert cache.get(f"thumbnail:{self.template.id}") == newest
+        self.template.refresh_from_db()
+        assert self.template.screenshot == screenshot_url
+
+    def sandbox_worker(self, script):
+        # A stand-in worker running the script for every task it reads
+        return SandboxWorker(
+            [
+                sys.executable,
+                "-c",
+                f"import sys, time\nfor line in sys.stdin:\n    {script}",
+            ]
+        )
+
+    def test_sandbox_kills_slow_render(self):
+        worker = self.sandbox_worker("time.sleep(30)")
+        self.addCleanup(worker.close)
+        with self.assertRaisesMessage(RenderKilled, "timed out"):
+            worker.run({}, timeout=0.5, max_memory=2**30)
+        assert not worker.is_alive()
+
+    def test_sandbox_kills_memory_hungry_render(self):
+        worker = self.sandbox_worker("data = b'x' * 2**28; time.sleep(30)")
+        self.addCleanup(worker.close)
+        with self.assertRaisesMessage(RenderKilled, "more than"):
+            worker.run({}, timeout=30, max_memory=2**27)
+        assert not worker.is_alive()
+
+    def test_sandbox_pool_reuses_workers(self):
+        pool = SandboxPool(
+            size=1,
+            max_tasks=2,
+            command=[
+                sys.executable,
+                "-c",
+                "import os, sys\nfor line in sys.stdin:\n"
+                "    print('{\"pid\": %d}' % os.getpid(), flush=True)",
+            ],
+        )
+        self.addCleanup(pool.close)
+        pids = [pool.run({}, timeout=30, max_memory=2**30) for _ in range(3)]
+        assert pids[0] == pids[1]
+        assert pids[2] != pids[0]
+
+    def test_convert_template_in_sandbox(self):
+        self.template.content_html = "<p>Sandboxed</p>"
+        with convert_template(self.template, C.EXPORT_TYPE_DOCX) as output:
+            with zipfile.ZipFile(output) as document:
+                assert "word/document.xml" in document.namelist()
+        # The next render is answered by the same worker
+        pool = get_sandbox_pool()
+        self.addCleanup(pool.close)
+        worker = pool.idle.queue[-1]
+        convert_template(self.template, C.EXPORT_TYPE_DOCX).close()
+        assert pool.idle.queue == [worker]
+        assert worker.tasks == 2
+
+    @mock.patch("apps.template.schemas.schema.import_templates.delay")
+    def test_import_templates(self, delay):
+        query = """
+            mutation importTemplates($company: String!, $file: Upload!) {
+                importTemplates(company: $company, file: $file) {
+                    jobId
+                }
+            }
+            """
+        records = [
+            {"name": "First", "categories": [self.template_category.name]},
+            {"name": "Second", "content_json": {"blocks": []}},
+            {"summary": "Without a name"},
+        ]
+        upload = SimpleUploadedFile(
+            "library.ndjson",
+            "\n".join(json.dumps(record) for record in records).encode(),
+        )
+        variables = {"company": str(self.company.id), "file": upload}
+        response = self.client.execute(query, variables)
+        job_id = response.data["importTemplates"]["jobId"]
+        delay.assert_called_once_with(job_id)
+        with self.settings(TEMPLATE_IMPORT_BATCH_SIZE=1):
+            import_templates(job_id)
+        job = ImportJob.objects.get(id=job_id)
+        assert job.status == C.JOB_STATUS_SUCCESS
+        assert (job.imported, job.failed) == (2, 1)
+        assert job.error.startswith("library.ndjson:3:")
+        assert not default_storage.exists(job.file)
+        template = Template.objects.get(company=self.company, name="First")
+        assert list(template.categories.all()) == [self.template_category]
+
+    def test_import_templates_zip(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zip_file:
+            zip_file.writestr("one.json", json.dumps({"name": "One"}))
+            zip_file.writestr(
+                "more.ndjson",
+                json.dumps({"name": "Two"}) + "\n" + json.dumps({"name": 3}),
+            )
+        job = ImportJob(company=self.company)
+        job.file = default_storage.save(
+            f"imports/{job.id}/library.zip", ContentFile(archive.getvalue())
+        )
+        job.save()
+        import_templates(str(job.id))
+        job.refresh_from_db()
+        assert (job.imported, job.failed) == (2, 1)
+        assert job.error.startswith("more.ndjson:2:")
@@ -1,34 +1,245 @@
+import os
+import tempfile
+import uuid
+
 import pdfkit
-from html2image import Html2Image
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models.deletion import Collector
 from htmldocx import HtmlToDocx
+from PIL import Image
+
+import apps.data.constants as C
+from app.views import invalidate_cached_responses
+from apps.template.browsers import take_screenshot
+from apps.template.cache import (get_render_cache, remember_template_render,
+                                 render_key)
+from apps.template.feed import remove_gallery_cards
+from apps.template.gallery import gallery_facet_keys, refresh_gallery_facets
+from apps.template.models import (Template, TemplateCategory,
+                                  TemplateSearchIndex)
+from apps.template.sandbox import convert_in_sandbox
+from apps.template.search import index_templates
 
 
-def convert_html_to_png(template):
-    hti = Html2Image()
-    image = hti.screenshot(
-        html_file=template.content_html,
-        save_as=f"template-{template.id}.png",
+def spooled_file():
+    """
+    A file kept in memory until it grows over TEMPLATE_EXPORT_SPOOL_SIZE
+    """
+    return tempfile.SpooledTemporaryFile(
+        max_size=settings.TEMPLATE_EXPORT_SPOOL_SIZE
     )
-    return image
 
 
-def convert_html_to_pdf(template):
-    return pdfkit.from_file(
-        template.content_html, f"template-{template.id}.pdf"
+def convert_html_to_png(template, options=None):
+    options = options or {}
+    output = spooled_file()
+    # Chrome reads the html from disk, from a scratch directory of this
+    # render that is removed right after
+    with tempfile.TemporaryDirectory(prefix="screenshot-") as directory:
+        path = os.path.join(directory, f"template-{template.id}.html")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(template.content_html or "")
+        output.write(take_screenshot(path, options.get("size", (1920, 1080))))
+    output.seek(0)
+    return output
+
+
+def convert_html_to_pdf(template, options=None):
+    output = spooled_file()
+    output.write(
+        pdfkit.from_string(template.content_html, False, options=options)
     )
+    output.seek(0)
+    return output
 
 
-def convert_html_to_docx(template):
+def convert_html_to_docx(template, options=None):
+    output = spooled_file()
     parser = HtmlToDocx()
-    return parser.parse_html_file(
-        template.content_html, f"template-{template.id}.docx"
-    )
+    document = parser.parse_html_string(template.content_html)
+    document.save(output)
+    output.seek(0)
+    return output
 
 
-def convert_html_to_jpeg(template):
-    hti = Html2Image()
-    image = hti.screenshot(
-        html_file=template.content_html,
-        save_as=f"template-{template.id}.jpeg",
-    )
-    return image
+def convert_html_to_jpeg(template, options=None):
+    with convert_html_to_png(template, options) as png_file:
+        return png_to_jpeg(png_file)
+
+
+def make_thumbnails(png_file, widths, formats):
+    """
+    Resize a screenshot to every width and format and return a list of
+    (format, width, file) tuples
+    """
+    thumbnails = []
+    png_file.seek(0)
+    with Image.open(png_file) as image:
+        image = image.convert("RGB")
+        for width in widths:
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            for file_format in formats:
+                output = spooled_file()
+                resized.save(output, file_format.upper(), quality=80)
+                output.seek(0)
+                thumbnails.append((file_format, width, output))
+    png_file.seek(0)
+    return thumbnails
+
+
+def png_to_jpeg(png_file, quality=90):
+    """
+    Derive a jpeg from an existing png screenshot
+    """
+    output = spooled_file()
+    png_file.seek(0)
+    with Image.open(png_file) as image:
+        image.convert("RGB").save(output, "JPEG", quality=quality)
+    png_file.seek(0)
+    output.seek(0)
+    return output
+
+
+CONVERTERS = {
+    C.EXPORT_TYPE_PDF: convert_html_to_pdf,
+    C.EXPORT_TYPE_PNG: convert_html_to_png,
+    C.EXPORT_TYPE_DOCX: convert_html_to_docx,
+    C.EXPORT_TYPE_JPEG: convert_html_to_jpeg,
+}
+
+
+def convert_template(template, file_type, options=None):
+    """
+    Render the template to the given export type and return the file
+    """
+    if settings.TEMPLATE_RENDER_SANDBOX["ENABLED"]:
+        return convert_in_sandbox(template, file_type, options)
+    return CONVERTERS[file_type](template, options)
+
+
+def render_template(template, file_type, options=None, convert=None):
+    """
+    Render the template through the render cache and return the file,
+    `convert` replaces the default converter on a cache miss
+    """
+    render_cache = get_render_cache()
+    key = render_key(template.content_html, file_type, options)
+    data = render_cache.get(key)
+    if data is not None:
+        output = spooled_file()
+        output.write(data)
+        output.seek(0)
+        return output
+    if convert:
+        output = convert()
+    else:
+        output = convert_template(template, file_type, options)
+    output.seek(0, os.SEEK_END)
+    size = output.tell()
+    output.seek(0)
+    if size <= render_cache.max_entry_size:
+        if render_cache.set(key, output.read()):
+            remember_template_render(template.id, key)
+        output.seek(0)
+    return output
+
+
+def render_template_formats(template, file_types, options=None):
+    """
+    Render several export types in one pass, a jpeg next to a png is derived
+    from the png screenshot instead of launching the browser twice
+    """
+    files = {}
+    if {C.EXPORT_TYPE_PNG, C.EXPORT_TYPE_JPEG} <= set(file_types):
+        png_file = render_template(template, C.EXPORT_TYPE_PNG, options)
+        files[C.EXPORT_TYPE_PNG] = png_file
+        files[C.EXPORT_TYPE_JPEG] = render_template(
+            template,
+            C.EXPORT_TYPE_JPEG,
+            options,
+            convert=lambda: png_to_jpeg(png_file),
+        )
+    for file_type in file_types:
+        if file_type not in files:
+            files[file_type] = render_template(template, file_type, options)
+    return files
+
+
+def delete_templates(template_ids, chunk_size):
+    """
+    Delete the templates a chunk per transaction, so no single statement
+    holds row locks on the whole set, the gallery is updated once per chunk
+    instead of by the delete signals of every template
+    """
+    # The tasks module imports this one
+    from apps.template.tasks import schedule_gallery_feed
+
+    template_ids = list(template_ids)
+    while template_ids:
+        chunk = template_ids[:chunk_size]
+        template_ids = template_ids[chunk_size:]
+        with transaction.atomic():
+            category_ids, company_ids = gallery_facet_keys(
+                TemplateSearchIndex.objects.filter(
+                    template_id__in=chunk
+                ).values_list("in_gallery", "company_id", "category_ids")
+            )
+            # One statement for the category rows of the whole chunk
+            Template.categories.through.objects.filter(
+                template_id__in=chunk
+            ).delete()
+            templates = list(Template.objects.filter(id__in=chunk).only("id"))
+            for template in templates:
+                template._deleted_in_batch = True
+            collector = Collector(using=router.db_for_write(Template))
+            collector.collect(templates)
+            collector.delete()
+            refresh_gallery_facets(category_ids, company_ids)
+            remove_gallery_cards(chunk)
+            # Only gallery templates are counted for a company
+            if company_ids:
+                schedule_gallery_feed()
+                invalidate_cached_responses("template")
+
+
+def sync_template_categories(template, category_ids):
+    """
+    Make the categories of the template exactly the existing categories of
+    category_ids, only the difference is written
+    """
+    requested = set()
+    for category_id in category_ids:
+        try:
+            requested.add(uuid.UUID(str(category_id)))
+        except ValueError:
+            continue
+    through = Template.categories.through
+    with transaction.atomic():
+        requested = set(
+            TemplateCategory.objects.filter(id__in=requested).values_list(
+                "id", flat=True
+            )
+        )
+        current = set(
+            through.objects.filter(template_id=template.id).values_list(
+                "templatecategory_id", flat=True
+            )
+        )
+        through.objects.bulk_create(
+            [
+                through(template_id=template.id, templatecategory_id=id)
+                for id in requested - current
+            ]
+        )
+        if current - requested:
+            through.objects.filter(
+                template_id=template.id,
+                templatecategory_id__in=current - requested,
+            ).delete()
+        # Category names are searchable, bulk writes send no m2m signals
+        if requested != current:
+            index_templates([template.id])
+            if template.is_public and template.is_approved:
+                invalidate_cached_responses("template")
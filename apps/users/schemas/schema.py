@@ -6,6 +6,7 @@ from graphql import GraphQLError
 from graphql_jwt.decorators import login_required, permission_required
 from graphql_jwt.utils import jwt_encode, jwt_payload
 
+from apps.base.selections import optimize_queryset
 from apps.company.models import Company
 from apps.mail.tasks import send_email
 from apps.users.utils import decode_token
@@ -16,7 +17,7 @@ User = get_user_model()
 class UserType(DjangoObjectType):
     class Meta:
         model = get_user_model()
-        fields = "__all__"
+        exclude = ["templaterevision_set", "exportjob_set", "importjob_set"]
 
 
 class GroupType(DjangoObjectType):
@@ -51,28 +52,30 @@ class Query(graphene.ObjectType):
     def resolve_get_invited_users(self, info, id):
         company = Company.objects.filter(id=id).first()
         if company:
-            return company.invited_users.all()
+            return optimize_queryset(company.invited_users.all(), info)
         return []
 
     @login_required
     @permission_required("users.view_user")
     def resolve_get_user_detail(self, info, id):
-        return User.objects.filter(id=id).first()
+        return optimize_queryset(User.objects.filter(id=id), info).first()
 
     @login_required
     @permission_required("auth.view_group")
     def resolve_get_company_permission_groups(self, info, id):
-        return Group.objects.filter(company_id=id)
+        return optimize_queryset(Group.objects.filter(company_id=id), info)
 
     @login_required
     @permission_required("auth.view_permission")
     def resolve_get_permissions_for_company(self, info, id):
-        return Permission.objects.filter(company__id=id)
+        return optimize_queryset(
+            Permission.objects.filter(company__id=id), info
+        )
 
     @login_required
     @permission_required("users.view_user")
     def resolve_get_group_users(self, info, id):
-        return User.objects.filter(groups__id=id)
+        return optimize_queryset(User.objects.filter(groups__id=id), info)
 
 
 class RegisterUser(graphene.Mutation):